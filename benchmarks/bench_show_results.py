@@ -0,0 +1,77 @@
+"""Время построения DataFrame из строк show_tables_content().
+
+Сравнивает прежний способ (DataFrame на каждую строку + pd.concat) с
+построением одного DataFrame на таблицу в columnar.json_rows_to_frames.
+
+    python benchmarks/bench_show_results.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "streamlit"))
+
+import columnar  # noqa: E402
+
+
+def make_rows(count):
+    """Строки в том виде, в котором их возвращает show_tables_content()"""
+    return [
+        (
+            "orderitems",
+            {
+                "order_item_id": index,
+                "order_id": index // 10,
+                "product_id": index % 500,
+                "quantity": index % 7 + 1,
+            },
+        )
+        for index in range(count)
+    ]
+
+
+def legacy_frames(result):
+    """Прежняя реализация StreamlitDatabaseApp.__show_results"""
+    tables_data = {}
+    for table_name, table_content in result:
+        tables_data.setdefault(table_name, []).append(table_content)
+    return {
+        table_name: pd.concat([pd.DataFrame([row]) for row in table_content])
+        for table_name, table_content in tables_data.items()
+    }
+
+
+def measure(function, rows):
+    start = time.perf_counter()
+    function(rows)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--legacy-max",
+        type=int,
+        default=100_000,
+        help="largest size to run the per-row implementation on",
+    )
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy, s':>12} {'single pass, s':>16}")
+    for size in args.sizes:
+        rows = make_rows(size)
+        legacy = measure(legacy_frames, rows) if size <= args.legacy_max else None
+        single_pass = measure(columnar.json_rows_to_frames, rows)
+        legacy_text = f"{legacy:.3f}" if legacy is not None else "skipped"
+        print(f"{size:>10} {legacy_text:>12} {single_pass:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
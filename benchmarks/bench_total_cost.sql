@@ -0,0 +1,101 @@
+-- Время массовой вставки позиций заказа: прежний построчный триггер
+-- calculate_total_cost (пересчет заказа целиком и два UPDATE Orders на строку)
+-- против триггеров уровня оператора с таблицами переходов.
+--
+--     psql -d delivery -U chill_owner -f benchmarks/bench_total_cost.sql
+--
+-- Все изменения делаются в одной транзакции и откатываются в конце.
+BEGIN;
+
+-- Прежняя реализация триггера
+CREATE FUNCTION pg_temp.legacy_calculate_total_cost() RETURNS TRIGGER AS $$
+DECLARE
+    current_total_cost INT;
+BEGIN
+    SELECT COALESCE(SUM(p.price * oi.quantity), 0)
+    INTO current_total_cost
+    FROM delivery_tables_schema.OrderItems oi
+    JOIN delivery_tables_schema.Products p ON oi.product_id = p.product_id
+    WHERE oi.order_id = COALESCE(NEW.order_id, OLD.order_id);
+
+    UPDATE delivery_tables_schema.Orders
+    SET total_cost = current_total_cost
+    WHERE order_id = COALESCE(NEW.order_id, OLD.order_id);
+
+    IF current_total_cost > 0 THEN
+        UPDATE delivery_tables_schema.Orders
+        SET status = 'Pending'
+        WHERE order_id = COALESCE(NEW.order_id, OLD.order_id);
+    ELSE
+        UPDATE delivery_tables_schema.Orders
+        SET status = 'Created'
+        WHERE order_id = COALESCE(NEW.order_id, OLD.order_id);
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_user_id INT;
+    v_product_id INT;
+    v_order_id INT;
+    v_order_date TIMESTAMP;
+    v_lines INT;
+    v_started TIMESTAMP;
+    v_statement INTERVAL;
+    v_legacy INTERVAL;
+    v_statement_total INT;
+    v_legacy_total INT;
+BEGIN
+    INSERT INTO delivery_tables_schema.Users(name, phone, address)
+    VALUES ('bench', '0', 'bench')
+    RETURNING user_id INTO v_user_id;
+    INSERT INTO delivery_tables_schema.Products(name, price, stock)
+    VALUES ('bench', 10, 1000000000)
+    RETURNING product_id INTO v_product_id;
+
+    FOREACH v_lines IN ARRAY ARRAY[10, 200, 1000, 5000] LOOP
+        -- Триггеры уровня оператора
+        INSERT INTO delivery_tables_schema.Orders(user_id, status)
+        VALUES (v_user_id, 'Created')
+        RETURNING order_id, order_date INTO v_order_id, v_order_date;
+        v_started := clock_timestamp();
+        INSERT INTO delivery_tables_schema.OrderItems(order_id, order_date, product_id, quantity)
+        SELECT v_order_id, v_order_date, v_product_id, 1 FROM generate_series(1, v_lines);
+        v_statement := clock_timestamp() - v_started;
+        SELECT total_cost INTO v_statement_total
+        FROM delivery_tables_schema.Orders WHERE order_id = v_order_id;
+
+        -- Прежний построчный триггер
+        ALTER TABLE delivery_tables_schema.OrderItems DISABLE TRIGGER calculate_total_cost_insert_trigger;
+        CREATE TRIGGER legacy_calculate_total_cost_trigger
+        AFTER INSERT ON delivery_tables_schema.OrderItems
+        FOR EACH ROW
+        EXECUTE FUNCTION pg_temp.legacy_calculate_total_cost();
+
+        INSERT INTO delivery_tables_schema.Orders(user_id, status)
+        VALUES (v_user_id, 'Created')
+        RETURNING order_id, order_date INTO v_order_id, v_order_date;
+        v_started := clock_timestamp();
+        INSERT INTO delivery_tables_schema.OrderItems(order_id, order_date, product_id, quantity)
+        SELECT v_order_id, v_order_date, v_product_id, 1 FROM generate_series(1, v_lines);
+        v_legacy := clock_timestamp() - v_started;
+        SELECT total_cost INTO v_legacy_total
+        FROM delivery_tables_schema.Orders WHERE order_id = v_order_id;
+
+        DROP TRIGGER legacy_calculate_total_cost_trigger ON delivery_tables_schema.OrderItems;
+        ALTER TABLE delivery_tables_schema.OrderItems ENABLE TRIGGER calculate_total_cost_insert_trigger;
+
+        IF v_statement_total IS DISTINCT FROM v_legacy_total THEN
+            RAISE EXCEPTION 'Totals differ for % lines: % vs %', v_lines, v_statement_total, v_legacy_total;
+        END IF;
+
+        RAISE NOTICE 'lines: %, statement-level: %, legacy row-level: %',
+            v_lines, v_statement, v_legacy;
+    END LOOP;
+END;
+$$;
+
+ROLLBACK;
@@ -0,0 +1,48 @@
+-- Проверка подсказок по началу имени: suggest_product_names и suggest_user_names
+-- вызываются с настоящим префиксом и должны вернуть только подходящие строки
+-- в порядке имени.
+--
+--     psql -d delivery -U chill_owner -f benchmarks/check_suggest_names.sql
+--
+-- Все изменения делаются в одной транзакции и откатываются в конце.
+BEGIN;
+
+DO $$
+DECLARE
+    v_names TEXT[];
+BEGIN
+    INSERT INTO delivery_tables_schema.Products(name, price, stock)
+    VALUES ('Suggest Check Apple', 10, 1),
+           ('suggest check avocado', 10, 1),
+           ('Suggest Chec', 10, 1),
+           ('Other Suggest Check', 10, 1);
+    INSERT INTO delivery_tables_schema.Users(name, phone, address)
+    VALUES ('Suggest Check Anna', '0', 'check'),
+           ('Suggest Other', '0', 'check');
+
+    SELECT array_agg(name::TEXT ORDER BY lower(name))
+    INTO v_names
+    FROM delivery_schema.suggest_product_names('suggest check a', 10);
+    IF v_names IS DISTINCT FROM ARRAY['Suggest Check Apple', 'suggest check avocado'] THEN
+        RAISE EXCEPTION 'suggest_product_names returned %', v_names;
+    END IF;
+
+    SELECT array_agg(name::TEXT)
+    INTO v_names
+    FROM delivery_schema.suggest_product_names('SUGGEST CHECK', 1);
+    IF cardinality(v_names) IS DISTINCT FROM 1 THEN
+        RAISE EXCEPTION 'suggest_product_names ignored the limit: %', v_names;
+    END IF;
+
+    SELECT array_agg(name::TEXT)
+    INTO v_names
+    FROM delivery_schema.suggest_user_names('Suggest Check', 10);
+    IF v_names IS DISTINCT FROM ARRAY['Suggest Check Anna'] THEN
+        RAISE EXCEPTION 'suggest_user_names returned %', v_names;
+    END IF;
+
+    RAISE NOTICE 'suggest_product_names and suggest_user_names: ok';
+END;
+$$;
+
+ROLLBACK;
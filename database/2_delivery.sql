@@ -13,6 +13,7 @@ SET row_security = off;
 DROP SCHEMA IF EXISTS delivery_tables_schema CASCADE;
 DROP SCHEMA IF EXISTS delivery_schema CASCADE;
 DROP SCHEMA IF EXISTS delivery_init_schema CASCADE;
+DROP SCHEMA IF EXISTS delivery_archive CASCADE;
 DROP DATABASE IF EXISTS delivery;
 DROP ROLE IF EXISTS chill_user;
 
@@ -31,6 +32,8 @@ CREATE SCHEMA delivery_tables_schema;
 CREATE SCHEMA delivery_schema;
 -- Создаем схему для инициализации
 CREATE SCHEMA delivery_init_schema;
+-- Создаем схему для архива старых заказов
+CREATE SCHEMA delivery_archive;
 
 -- Добавляем в search_path обе схемы
 ALTER DATABASE delivery SET search_path TO delivery_schema, delivery_tables_schema, delivery_init_schema, public;
@@ -55,142 +58,326 @@ CREATE TABLE delivery_tables_schema.Products (
     stock INT NOT NULL CONSTRAINT positive_stock CHECK (stock > 0)
 );
 
--- Таблица Orders
+-- Таблица Orders, секционированная по месяцам order_date
+-- (ключ секционирования входит в первичный ключ)
 CREATE TABLE delivery_tables_schema.Orders (
-    order_id SERIAL PRIMARY KEY,
+    order_id SERIAL,
     user_id INT REFERENCES delivery_tables_schema.Users(user_id) ON DELETE CASCADE,
-    order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    order_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     total_cost INT DEFAULT 0,
-    status VARCHAR(20) NOT NULL
-);
-
--- Таблица OrderItems
+    status VARCHAR(20) NOT NULL,
+    -- Курьерский диспетчер, взявший заказ в работу, и время захвата
+    claimed_by VARCHAR(50),
+    claimed_at TIMESTAMP,
+    PRIMARY KEY (order_id, order_date)
+) PARTITION BY RANGE (order_date);
+
+-- Таблица OrderItems, секционированная так же, как Orders: order_date позиции равна дате
+-- ее заказа, поэтому позиции лежат в секции за тот же месяц, что и заказ
 CREATE TABLE delivery_tables_schema.OrderItems (
-    order_item_id SERIAL PRIMARY KEY,
-    order_id INT REFERENCES delivery_tables_schema.Orders(order_id) ON DELETE CASCADE,
+    order_item_id SERIAL,
+    order_id INT,
+    order_date TIMESTAMP NOT NULL,
     product_id INT REFERENCES delivery_tables_schema.Products(product_id) ON DELETE CASCADE,
-    quantity INT NOT NULL CONSTRAINT positive_quantity CHECK (quantity > 0)
-);
+    quantity INT NOT NULL CONSTRAINT positive_quantity CHECK (quantity > 0),
+    -- Цена товара на момент добавления позиции
+    unit_price INT,
+    PRIMARY KEY (order_item_id, order_date),
+    FOREIGN KEY (order_id, order_date) REFERENCES delivery_tables_schema.Orders(order_id, order_date) ON DELETE CASCADE
+) PARTITION BY RANGE (order_date);
+
+-- Секции по умолчанию для строк, месяц которых еще не создан
+-- (месячные секции создает delivery_init_schema.create_order_partitions)
+CREATE TABLE delivery_tables_schema.Orders_default PARTITION OF delivery_tables_schema.Orders DEFAULT;
+CREATE TABLE delivery_tables_schema.OrderItems_default PARTITION OF delivery_tables_schema.OrderItems DEFAULT;
 
 -- Создание индексов
 CREATE INDEX lower_idx_product_name ON delivery_tables_schema.Products(lower(name));
 CREATE INDEX lower_idx_username ON delivery_tables_schema.Users(lower(name));
+-- Индексы для подсказок по началу имени: text_pattern_ops работает при любой collation
+CREATE INDEX pattern_idx_product_name ON delivery_tables_schema.Products(lower(name) text_pattern_ops);
+CREATE INDEX pattern_idx_username ON delivery_tables_schema.Users(lower(name) text_pattern_ops);
+
+-- Индексы для поиска товаров по описанию: триграммы (ILIKE по подстроке и префиксу)
+-- и полнотекстовый поиск
+CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;
+CREATE INDEX trgm_idx_product_description ON delivery_tables_schema.Products USING gin (description gin_trgm_ops);
+CREATE INDEX fts_idx_product_description ON delivery_tables_schema.Products USING gin (to_tsvector('simple', COALESCE(description, '')));
+
+-- Индексы на внешние ключи: по ним фильтруют триггеры и каскадные удаления
+CREATE INDEX fk_idx_orders_user_id ON delivery_tables_schema.Orders(user_id);
+CREATE INDEX fk_idx_orderitems_order_id ON delivery_tables_schema.OrderItems(order_id, order_date);
+CREATE INDEX fk_idx_orderitems_product_id ON delivery_tables_schema.OrderItems(product_id);
+
+-- Очередь заказов на доставку: только ожидающие заказы в порядке оформления
+CREATE INDEX pending_idx_order_date ON delivery_tables_schema.Orders(order_date) WHERE status = 'Pending';
+-- Выбор самых старых заказов для архивации
+CREATE INDEX idx_order_date ON delivery_tables_schema.Orders(order_date);
+
+-- *** АРХИВ ***
+-- Заказы и позиции, перенесенные из основных таблиц функцией archive_orders.
+-- Внешних ключей нет: товары и пользователи архивных заказов могут быть удалены
+CREATE TABLE delivery_archive.Orders (
+    order_id INT PRIMARY KEY,
+    user_id INT,
+    order_date TIMESTAMP NOT NULL,
+    total_cost INT,
+    status VARCHAR(20) NOT NULL,
+    claimed_by VARCHAR(50),
+    claimed_at TIMESTAMP,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE delivery_archive.OrderItems (
+    order_item_id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    order_date TIMESTAMP NOT NULL,
+    product_id INT,
+    quantity INT NOT NULL,
+    unit_price INT,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX archive_idx_orderitems_order_id ON delivery_archive.OrderItems(order_id);
 
 -- *** ПРОЦЕДУРЫ И ФУНКЦИИ ***
 -- Логика в схеме delivery_schema
--- Триггер для вычисления общей стоимости заказа
+-- Триггер для фиксации цены товара в позиции заказа: при вставке без цены и при смене товара
+CREATE OR REPLACE FUNCTION delivery_schema.set_unit_price() RETURNS TRIGGER AS $$
+BEGIN
+    SELECT price INTO NEW.unit_price
+    FROM delivery_tables_schema.Products
+    WHERE product_id = NEW.product_id;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER set_unit_price_insert_trigger
+BEFORE INSERT ON delivery_tables_schema.OrderItems
+FOR EACH ROW
+WHEN (NEW.unit_price IS NULL)
+EXECUTE FUNCTION delivery_schema.set_unit_price();
+
+CREATE TRIGGER set_unit_price_update_trigger
+BEFORE UPDATE OF product_id ON delivery_tables_schema.OrderItems
+FOR EACH ROW
+WHEN (NEW.product_id IS DISTINCT FROM OLD.product_id AND NEW.unit_price IS NOT DISTINCT FROM OLD.unit_price)
+EXECUTE FUNCTION delivery_schema.set_unit_price();
+
+-- Пересчет общей стоимости и статуса заказов целиком по зафиксированным ценам позиций
+-- (для сверки и исправления данных, триггеры работают с разницами).
+-- Статус меняется только у заказов в статусе Created или Pending, остальные
+-- (Dispatching, Completed и т.д.) сохраняют свой статус
+CREATE OR REPLACE FUNCTION delivery_schema.recalculate_total_cost(p_order_ids INT[]) RETURNS VOID AS $$
+BEGIN
+    UPDATE delivery_tables_schema.Orders o
+    SET total_cost = t.total_cost,
+        status = CASE
+            WHEN o.status NOT IN ('Created', 'Pending') THEN o.status
+            WHEN t.total_cost > 0 THEN 'Pending'
+            ELSE 'Created'
+        END
+    FROM (
+        SELECT a.order_id, COALESCE(SUM(oi.unit_price * oi.quantity), 0) AS total_cost
+        FROM unnest(p_order_ids) AS a(order_id)
+        LEFT JOIN delivery_tables_schema.OrderItems oi ON oi.order_id = a.order_id
+        GROUP BY a.order_id
+    ) t
+    WHERE o.order_id = t.order_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Изменение общей стоимости заказов на разницу и статуса одним UPDATE, нулевые разницы пропускаются.
+-- Статус, как и при пересчете, меняется только у заказов в статусе Created или Pending
+CREATE OR REPLACE FUNCTION delivery_schema.change_total_cost(p_order_ids INT[], p_deltas INT[]) RETURNS VOID AS $$
+BEGIN
+    UPDATE delivery_tables_schema.Orders o
+    SET total_cost = COALESCE(o.total_cost, 0) + d.delta,
+        status = CASE
+            WHEN o.status NOT IN ('Created', 'Pending') THEN o.status
+            WHEN COALESCE(o.total_cost, 0) + d.delta > 0 THEN 'Pending'
+            ELSE 'Created'
+        END
+    FROM unnest(p_order_ids, p_deltas) AS d(order_id, delta)
+    WHERE o.order_id = d.order_id AND d.delta <> 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггер для вычисления общей стоимости заказа.
+-- Срабатывает один раз на оператор и читает таблицы переходов: стоимость каждого затронутого
+-- заказа меняется на сумму новых позиций минус сумма старых по зафиксированным ценам,
+-- без обращения к Products. Стоимость и статус записываются одним UPDATE.
 CREATE OR REPLACE FUNCTION delivery_schema.calculate_total_cost() RETURNS TRIGGER AS $$
-DECLARE
-    current_total_cost INT;
 BEGIN
-    -- Пересчитываем общую стоимость
-    SELECT COALESCE(SUM(p.price * oi.quantity), 0)
-    INTO current_total_cost
-    FROM delivery_tables_schema.OrderItems oi
-    JOIN delivery_tables_schema.Products p ON oi.product_id = p.product_id
-    WHERE oi.order_id = COALESCE(NEW.order_id, OLD.order_id); -- Для корректной работы с UPDATE и DELETE
+    -- При переносе в архив заказы удаляются вместе с позициями, пересчитывать нечего
+    IF current_setting('delivery.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
 
-    -- Обновляем поле total_cost
-    UPDATE delivery_tables_schema.Orders
-    SET total_cost = current_total_cost
-    WHERE order_id = COALESCE(NEW.order_id, OLD.order_id);
-
-    -- Обновляем статус заказа в зависимости от total_cost
-    IF current_total_cost > 0 THEN
-        UPDATE delivery_tables_schema.Orders
-        SET status = 'Pending'
-        WHERE order_id = COALESCE(NEW.order_id, OLD.order_id);
+    IF TG_OP = 'INSERT' THEN
+        PERFORM delivery_schema.change_total_cost(array_agg(order_id), array_agg(delta))
+        FROM (
+            SELECT n.order_id, SUM(n.unit_price * n.quantity)::INT AS delta
+            FROM new_items n
+            GROUP BY n.order_id
+        ) d;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Позиция могла перейти в другой заказ, поэтому учитываем заказы и старых, и новых строк.
+        -- Для старых строк без цены берется цена новой версии строки
+        PERFORM delivery_schema.change_total_cost(array_agg(order_id), array_agg(delta))
+        FROM (
+            SELECT order_id, SUM(delta)::INT AS delta
+            FROM (
+                SELECT n.order_id, n.unit_price * n.quantity AS delta
+                FROM new_items n
+                UNION ALL
+                SELECT o.order_id, -COALESCE(o.unit_price, n.unit_price) * o.quantity
+                FROM old_items o
+                LEFT JOIN new_items n ON n.order_item_id = o.order_item_id
+            ) items
+            GROUP BY order_id
+        ) d;
     ELSE
-        UPDATE delivery_tables_schema.Orders
-        SET status = 'Created'
-        WHERE order_id = COALESCE(NEW.order_id, OLD.order_id);
+        PERFORM delivery_schema.change_total_cost(array_agg(order_id), array_agg(delta))
+        FROM (
+            SELECT o.order_id, -SUM(o.unit_price * o.quantity)::INT AS delta
+            FROM old_items o
+            GROUP BY o.order_id
+        ) d;
     END IF;
 
-    RETURN NEW;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER calculate_total_cost_trigger
-AFTER INSERT OR UPDATE OR DELETE ON delivery_tables_schema.OrderItems
-FOR EACH ROW
+-- Таблицы переходов нельзя использовать в триггере на несколько событий, поэтому триггеров три
+CREATE TRIGGER calculate_total_cost_insert_trigger
+AFTER INSERT ON delivery_tables_schema.OrderItems
+REFERENCING NEW TABLE AS new_items
+FOR EACH STATEMENT
 EXECUTE FUNCTION delivery_schema.calculate_total_cost();
 
--- Триггер для уменьшения количества товара на складе
-CREATE OR REPLACE FUNCTION delivery_schema.decrease_product_stock() RETURNS TRIGGER AS $$
-BEGIN
-    UPDATE delivery_tables_schema.Products
-    SET stock = stock - NEW.quantity
-    WHERE product_id = NEW.product_id;
+CREATE TRIGGER calculate_total_cost_update_trigger
+AFTER UPDATE ON delivery_tables_schema.OrderItems
+REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+FOR EACH STATEMENT
+EXECUTE FUNCTION delivery_schema.calculate_total_cost();
+
+CREATE TRIGGER calculate_total_cost_delete_trigger
+AFTER DELETE ON delivery_tables_schema.OrderItems
+REFERENCING OLD TABLE AS old_items
+FOR EACH STATEMENT
+EXECUTE FUNCTION delivery_schema.calculate_total_cost();
 
-    -- Проверяем, что stock не стал отрицательным
-    IF (SELECT stock FROM delivery_tables_schema.Products WHERE product_id = NEW.product_id) < 0 THEN
-        RAISE EXCEPTION 'Insufficient stock for product_id %', NEW.product_id;
+-- Изменение остатков товаров одним UPDATE ... RETURNING: по одной строке на товар,
+-- отрицательный остаток проверяется в том же операторе
+CREATE OR REPLACE FUNCTION delivery_schema.change_product_stock(p_product_ids INT[], p_deltas INT[]) RETURNS VOID AS $$
+DECLARE
+    v_product_id INT;
+BEGIN
+    WITH changed AS (
+        UPDATE delivery_tables_schema.Products p
+        SET stock = p.stock + d.delta
+        FROM unnest(p_product_ids, p_deltas) AS d(product_id, delta)
+        WHERE p.product_id = d.product_id
+        RETURNING p.product_id, p.stock
+    )
+    SELECT product_id INTO v_product_id FROM changed WHERE stock < 0 LIMIT 1;
+
+    IF v_product_id IS NOT NULL THEN
+        RAISE EXCEPTION 'Insufficient stock for product_id %', v_product_id;
     END IF;
+END;
+$$ LANGUAGE plpgsql;
 
-    RETURN NEW;
+-- Триггер для уменьшения количества товара на складе.
+-- Срабатывает один раз на оператор: количество суммируется по товарам из таблицы переходов
+CREATE OR REPLACE FUNCTION delivery_schema.decrease_product_stock() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM delivery_schema.change_product_stock(array_agg(product_id), array_agg(-quantity))
+    FROM (
+        SELECT product_id, SUM(quantity)::INT AS quantity
+        FROM new_items
+        GROUP BY product_id
+    ) d;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER decrease_product_stock_trigger
 AFTER INSERT ON delivery_tables_schema.OrderItems
-FOR EACH ROW
+REFERENCING NEW TABLE AS new_items
+FOR EACH STATEMENT
 EXECUTE FUNCTION delivery_schema.decrease_product_stock();
 
--- Триггер для обновления количества товара на складе
-CREATE OR REPLACE FUNCTION delivery_schema.update_product_stock() RETURNS TRIGGER AS $$
+-- Триггер для удаления позиции, у которой количество стало равно нулю.
+-- Товар возвращается на склад триггером удаления
+CREATE OR REPLACE FUNCTION delivery_schema.delete_empty_order_item() RETURNS TRIGGER AS $$
 BEGIN
-    IF NEW.quantity = 0 THEN
-        -- Возвращаем товар на склад перед удалением строки
-        UPDATE delivery_tables_schema.Products
-        SET stock = stock + OLD.quantity
-        WHERE product_id = OLD.product_id;
-
-        -- Удаляем строку из OrderItems
-        DELETE FROM delivery_tables_schema.OrderItems WHERE order_item_id = OLD.order_item_id;
-
-        RETURN NULL; -- Указывает, что строка должна быть удалена
-    END IF;
+    DELETE FROM delivery_tables_schema.OrderItems WHERE order_item_id = OLD.order_item_id;
 
-    -- Обновляем запасы на складе, если quantity изменилось
-    UPDATE delivery_tables_schema.Products
-    SET stock = stock + OLD.quantity - NEW.quantity
-    WHERE product_id = NEW.product_id;
+    RETURN NULL; -- Указывает, что строка должна быть удалена
+END;
+$$ LANGUAGE plpgsql;
 
-    -- Проверяем, что stock не стал отрицательным
-    IF (SELECT stock FROM delivery_tables_schema.Products WHERE product_id = NEW.product_id) < 0 THEN
-        RAISE EXCEPTION 'Insufficient stock for product_id %', NEW.product_id;
-    END IF;
+CREATE TRIGGER delete_empty_order_item_trigger
+BEFORE UPDATE ON delivery_tables_schema.OrderItems
+FOR EACH ROW
+WHEN (NEW.quantity = 0)
+EXECUTE FUNCTION delivery_schema.delete_empty_order_item();
 
-    RETURN NEW;
+-- Триггер для обновления количества товара на складе.
+-- Старые версии строк возвращают товар на склад, новые - списывают, в том числе при смене товара
+CREATE OR REPLACE FUNCTION delivery_schema.update_product_stock() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM delivery_schema.change_product_stock(array_agg(product_id), array_agg(delta))
+    FROM (
+        SELECT product_id, SUM(delta)::INT AS delta
+        FROM (
+            SELECT product_id, quantity AS delta FROM old_items
+            UNION ALL
+            SELECT product_id, -quantity FROM new_items
+        ) items
+        GROUP BY product_id
+        HAVING SUM(delta) <> 0
+    ) d;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER update_product_stock_trigger
-BEFORE UPDATE ON delivery_tables_schema.OrderItems
-FOR EACH ROW
+AFTER UPDATE ON delivery_tables_schema.OrderItems
+REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+FOR EACH STATEMENT
 EXECUTE FUNCTION delivery_schema.update_product_stock();
 
--- Триггер для удаления позиции в заказе
+-- Триггер для удаления позиции в заказе: возвращаем товар на склад.
+-- Общая стоимость заказа пересчитывается в calculate_total_cost после оператора
 CREATE OR REPLACE FUNCTION delivery_schema.delete_order_item() RETURNS TRIGGER AS $$
 BEGIN
-    -- Возвращаем товар на склад перед удалением строки
-    UPDATE delivery_tables_schema.Products
-    SET stock = stock + OLD.quantity
-    WHERE product_id = OLD.product_id;
+    -- Позиции, перенесенные в архив, уже доставлены: на склад они не возвращаются
+    IF current_setting('delivery.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
 
-    -- Обновляем общую стоимость заказа
-    UPDATE delivery_tables_schema.Orders 
-    SET total_cost = total_cost - OLD.quantity * (SELECT price FROM delivery_tables_schema.Products WHERE product_id = OLD.product_id)
-    WHERE order_id = OLD.order_id;
+    PERFORM delivery_schema.change_product_stock(array_agg(product_id), array_agg(quantity))
+    FROM (
+        SELECT product_id, SUM(quantity)::INT AS quantity
+        FROM old_items
+        GROUP BY product_id
+    ) d;
 
-    -- Возвращаем NULL, чтобы позволить стандартное удаление строки
-    RETURN OLD;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER delete_order_item_trigger
-BEFORE DELETE ON delivery_tables_schema.OrderItems
-FOR EACH ROW
+AFTER DELETE ON delivery_tables_schema.OrderItems
+REFERENCING OLD TABLE AS old_items
+FOR EACH STATEMENT
 EXECUTE FUNCTION delivery_schema.delete_order_item();
 
 -- Даем пользователю chill_user доступ только к чтению и записи данных в схеме
@@ -233,22 +420,78 @@ BEGIN
     );
 
     CREATE TABLE delivery_tables_schema.Orders (
-        order_id SERIAL PRIMARY KEY,
+        order_id SERIAL,
         user_id INT REFERENCES delivery_tables_schema.Users(user_id) ON DELETE CASCADE,
-        order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        order_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
         total_cost INT DEFAULT 0,
-        status VARCHAR(20) NOT NULL
-    );
+        status VARCHAR(20) NOT NULL,
+        claimed_by VARCHAR(50),
+        claimed_at TIMESTAMP,
+        PRIMARY KEY (order_id, order_date)
+    ) PARTITION BY RANGE (order_date);
 
     CREATE TABLE delivery_tables_schema.OrderItems (
-        order_item_id SERIAL PRIMARY KEY,
-        order_id INT REFERENCES delivery_tables_schema.Orders(order_id) ON DELETE CASCADE,
+        order_item_id SERIAL,
+        order_id INT,
+        order_date TIMESTAMP NOT NULL,
         product_id INT REFERENCES delivery_tables_schema.Products(product_id) ON DELETE CASCADE,
-        quantity INT NOT NULL CONSTRAINT positive_quantity CHECK (quantity > 0)
-    );
+        quantity INT NOT NULL CONSTRAINT positive_quantity CHECK (quantity > 0),
+        unit_price INT,
+        PRIMARY KEY (order_item_id, order_date),
+        FOREIGN KEY (order_id, order_date) REFERENCES delivery_tables_schema.Orders(order_id, order_date) ON DELETE CASCADE
+    ) PARTITION BY RANGE (order_date);
+
+    CREATE TABLE delivery_tables_schema.Orders_default PARTITION OF delivery_tables_schema.Orders DEFAULT;
+    CREATE TABLE delivery_tables_schema.OrderItems_default PARTITION OF delivery_tables_schema.OrderItems DEFAULT;
+    CALL delivery_init_schema.create_order_partitions();
 
     CREATE INDEX lower_idx_product_name ON delivery_tables_schema.Products(lower(name));
     CREATE INDEX lower_idx_username ON delivery_tables_schema.Users(lower(name));
+    CREATE INDEX pattern_idx_product_name ON delivery_tables_schema.Products(lower(name) text_pattern_ops);
+    CREATE INDEX pattern_idx_username ON delivery_tables_schema.Users(lower(name) text_pattern_ops);
+
+    CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;
+    CREATE INDEX trgm_idx_product_description ON delivery_tables_schema.Products USING gin (description gin_trgm_ops);
+    CREATE INDEX fts_idx_product_description ON delivery_tables_schema.Products USING gin (to_tsvector('simple', COALESCE(description, '')));
+    CREATE INDEX fk_idx_orders_user_id ON delivery_tables_schema.Orders(user_id);
+    CREATE INDEX fk_idx_orderitems_order_id ON delivery_tables_schema.OrderItems(order_id, order_date);
+    CREATE INDEX fk_idx_orderitems_product_id ON delivery_tables_schema.OrderItems(product_id);
+    CREATE INDEX pending_idx_order_date ON delivery_tables_schema.Orders(order_date) WHERE status = 'Pending';
+    CREATE INDEX idx_order_date ON delivery_tables_schema.Orders(order_date);
+
+    -- Архив не удаляется вместе с основными таблицами, поэтому может уже существовать
+    CREATE SCHEMA IF NOT EXISTS delivery_archive;
+    CREATE TABLE IF NOT EXISTS delivery_archive.Orders (
+        order_id INT PRIMARY KEY,
+        user_id INT,
+        order_date TIMESTAMP NOT NULL,
+        total_cost INT,
+        status VARCHAR(20) NOT NULL,
+        claimed_by VARCHAR(50),
+        claimed_at TIMESTAMP,
+        archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS delivery_archive.OrderItems (
+        order_item_id INT PRIMARY KEY,
+        order_id INT NOT NULL,
+        order_date TIMESTAMP NOT NULL,
+        product_id INT,
+        quantity INT NOT NULL,
+        unit_price INT,
+        archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS archive_idx_orderitems_order_id ON delivery_archive.OrderItems(order_id);
+    GRANT USAGE ON SCHEMA delivery_archive TO chill_user;
+    GRANT SELECT, INSERT ON ALL TABLES IN SCHEMA delivery_archive TO chill_user;
+
+    -- Новые последовательности продолжают нумерацию после сохраненного архива,
+    -- иначе ключи новых заказов и позиций совпадут с архивными
+    PERFORM setval(pg_get_serial_sequence('delivery_tables_schema.orders', 'order_id'), MAX(order_id))
+    FROM delivery_archive.Orders
+    HAVING MAX(order_id) IS NOT NULL;
+    PERFORM setval(pg_get_serial_sequence('delivery_tables_schema.orderitems', 'order_item_id'), MAX(order_item_id))
+    FROM delivery_archive.OrderItems
+    HAVING MAX(order_item_id) IS NOT NULL;
 
     -- Даем доступ пользователю chill_user к схеме с таблицами
     GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA delivery_tables_schema TO chill_user;
@@ -266,16 +509,119 @@ BEGIN
 END;
 $$;
 
+-- Создание месячных секций Orders и OrderItems с месяца p_start (по умолчанию текущего)
+-- на p_months_ahead месяцев вперед. Уже существующие секции пропускаются.
+-- Процедуру нужно вызывать заранее (например, раз в месяц): секцию нельзя создать,
+-- если строки ее месяца уже попали в секцию по умолчанию
+CREATE OR REPLACE PROCEDURE delivery_init_schema.create_order_partitions(p_months_ahead INT DEFAULT 3, p_start DATE DEFAULT NULL)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_month DATE;
+    v_suffix TEXT;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        v_month := (date_trunc('month', COALESCE(p_start, CURRENT_DATE)) + make_interval(months => i))::DATE;
+        v_suffix := to_char(v_month, '"_p"YYYY_MM');
+
+        IF to_regclass('delivery_tables_schema.orders' || v_suffix) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE delivery_tables_schema.%I PARTITION OF delivery_tables_schema.Orders FOR VALUES FROM (%L) TO (%L)',
+                'orders' || v_suffix, v_month, v_month + INTERVAL '1 month'
+            );
+            -- Права на секционированную таблицу не переходят к секциям
+            EXECUTE format(
+                'GRANT SELECT, INSERT, UPDATE, DELETE ON delivery_tables_schema.%I TO chill_user',
+                'orders' || v_suffix
+            );
+        END IF;
+
+        IF to_regclass('delivery_tables_schema.orderitems' || v_suffix) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE delivery_tables_schema.%I PARTITION OF delivery_tables_schema.OrderItems FOR VALUES FROM (%L) TO (%L)',
+                'orderitems' || v_suffix, v_month, v_month + INTERVAL '1 month'
+            );
+            EXECUTE format(
+                'GRANT SELECT, INSERT, UPDATE, DELETE ON delivery_tables_schema.%I TO chill_user',
+                'orderitems' || v_suffix
+            );
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- Отключение месячных секций, которые целиком старше p_older_than: сначала секция позиций,
+-- затем секция заказов. По умолчанию отключенные секции удаляются; при p_detach_only они
+-- остаются отдельными таблицами (например, для выгрузки в архив) без внешнего ключа на Orders.
+-- Это операция над метаданными: строки не удаляются по одной и триггеры не срабатывают
+CREATE OR REPLACE PROCEDURE delivery_init_schema.drop_order_partitions(p_older_than DATE, p_detach_only BOOLEAN DEFAULT false)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_partition TEXT;
+    v_items_partition TEXT;
+    v_constraint TEXT;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'delivery_tables_schema.orders'::regclass
+          AND c.relname ~ '^orders_p[0-9]{4}_[0-9]{2}$'
+          AND to_date(substring(c.relname FROM 9), 'YYYY_MM') + INTERVAL '1 month' <= p_older_than
+        ORDER BY c.relname
+    LOOP
+        v_items_partition := 'orderitems' || substring(v_partition FROM 7);
+
+        IF to_regclass('delivery_tables_schema.' || v_items_partition) IS NOT NULL THEN
+            EXECUTE format(
+                'ALTER TABLE delivery_tables_schema.OrderItems DETACH PARTITION delivery_tables_schema.%I',
+                v_items_partition
+            );
+            IF p_detach_only THEN
+                -- Иначе отключенные позиции не дадут отключить секцию их заказов
+                FOR v_constraint IN
+                    SELECT conname
+                    FROM pg_constraint
+                    WHERE conrelid = ('delivery_tables_schema.' || v_items_partition)::regclass
+                      AND contype = 'f'
+                      AND confrelid = 'delivery_tables_schema.orders'::regclass
+                LOOP
+                    EXECUTE format(
+                        'ALTER TABLE delivery_tables_schema.%I DROP CONSTRAINT %I',
+                        v_items_partition, v_constraint
+                    );
+                END LOOP;
+            ELSE
+                EXECUTE format('DROP TABLE delivery_tables_schema.%I', v_items_partition);
+            END IF;
+        END IF;
+
+        EXECUTE format(
+            'ALTER TABLE delivery_tables_schema.Orders DETACH PARTITION delivery_tables_schema.%I',
+            v_partition
+        );
+        IF NOT p_detach_only THEN
+            EXECUTE format('DROP TABLE delivery_tables_schema.%I', v_partition);
+        END IF;
+
+        RAISE NOTICE 'Секция % отключена', v_partition;
+    END LOOP;
+END;
+$$;
+
 -- Вывод содержимого всех таблиц
 CREATE OR REPLACE FUNCTION delivery_schema.show_tables_content()
 RETURNS TABLE(table_name TEXT, row_content JSON) AS $$
 DECLARE
     tbl_name TEXT;
 BEGIN
+    -- Секционированные таблицы читаются через родительскую таблицу
     FOR tbl_name IN
-        SELECT tablename
-        FROM pg_tables
-        WHERE schemaname = 'delivery_tables_schema'
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'delivery_tables_schema'
+          AND c.relkind IN ('r', 'p')
+          AND NOT c.relispartition
     LOOP
         RETURN QUERY EXECUTE FORMAT(
             'SELECT %L AS table_name, row_to_json(t) AS row_content FROM %I t',
@@ -286,8 +632,86 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Краткая сводка по таблицам без чтения их содержимого:
+-- оценка числа строк из статистики (pg_class.reltuples) и размер на диске
+CREATE OR REPLACE FUNCTION delivery_schema.show_tables_summary()
+RETURNS TABLE(table_name TEXT, estimated_rows BIGINT, total_bytes BIGINT) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        c.relname::TEXT,
+        (
+            SELECT COALESCE(SUM(GREATEST(pc.reltuples, 0)), 0)::BIGINT
+            FROM pg_partition_tree(c.oid) t
+            JOIN pg_class pc ON pc.oid = t.relid
+            WHERE t.isleaf
+        ),
+        (
+            SELECT COALESCE(SUM(pg_total_relation_size(t.relid)), 0)::BIGINT
+            FROM pg_partition_tree(c.oid) t
+            WHERE t.isleaf
+        )
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'delivery_tables_schema'
+      AND c.relkind IN ('r', 'p')
+      AND NOT c.relispartition
+    ORDER BY c.relname;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Быстрая очистка таблиц через TRUNCATE ... CASCADE: p_table = NULL - все таблицы.
+-- TRUNCATE очищает и все ссылающиеся таблицы и не вызывает триггеры, поэтому остатки
+-- товаров и стоимость оставшихся заказов исправляются заранее одним UPDATE.
+-- Счетчики id не сбрасываются: иначе новые заказы получили бы айди заказов из архива.
+-- Выполняется с правами владельца таблиц, потому что TRUNCATE проверяет права на каждую
+-- секцию, а у chill_user есть только права на DELETE
+CREATE OR REPLACE PROCEDURE delivery_schema.truncate_tables(p_table TEXT DEFAULT NULL)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = pg_catalog, pg_temp
+AS $$
+BEGIN
+  IF p_table IS NULL THEN
+    TRUNCATE delivery_tables_schema.OrderItems,
+             delivery_tables_schema.Orders,
+             delivery_tables_schema.Products,
+             delivery_tables_schema.Users
+    CASCADE;
+    RETURN;
+  END IF;
+
+  IF p_table NOT IN ('users', 'products', 'orders', 'orderitems') THEN
+    RAISE EXCEPTION 'Быстрая очистка таблицы % не поддерживается.', p_table;
+  END IF;
+
+  -- Позиции удаляются вместе с заказами, поэтому товары возвращаются на склад
+  IF p_table IN ('users', 'orders', 'orderitems') THEN
+    PERFORM delivery_schema.change_product_stock(array_agg(product_id), array_agg(quantity))
+    FROM (
+        SELECT product_id, SUM(quantity)::INT AS quantity
+        FROM delivery_tables_schema.OrderItems
+        GROUP BY product_id
+    ) d;
+  END IF;
+
+  -- Позиции удаляются, а заказы остаются: стоимость уменьшается на сумму позиций
+  IF p_table IN ('products', 'orderitems') THEN
+    PERFORM delivery_schema.change_total_cost(array_agg(order_id), array_agg(delta))
+    FROM (
+        SELECT order_id, -SUM(unit_price * quantity)::INT AS delta
+        FROM delivery_tables_schema.OrderItems
+        GROUP BY order_id
+    ) d;
+  END IF;
+
+  EXECUTE format('TRUNCATE delivery_tables_schema.%I CASCADE;', p_table);
+END;
+$$;
+
 -- Очистка одной из таблиц(название задается пользователем)
-CREATE OR REPLACE PROCEDURE delivery_schema.clear_sertain_table(t_name TEXT)
+-- p_fast = true: TRUNCATE через truncate_tables вместо построчного DELETE
+CREATE OR REPLACE PROCEDURE delivery_schema.clear_sertain_table(t_name TEXT, p_fast BOOLEAN DEFAULT false)
 LANGUAGE plpgsql AS $$
 DECLARE
   request TEXT;
@@ -296,8 +720,12 @@ BEGIN
     RAISE EXCEPTION 'Таблица % не существует.', t_name;
   END IF;
 
-  request := format('DELETE FROM %I;', t_name);
-  EXECUTE request;
+  IF p_fast THEN
+    CALL delivery_schema.truncate_tables(t_name);
+  ELSE
+    request := format('DELETE FROM %I;', t_name);
+    EXECUTE request;
+  END IF;
   RAISE NOTICE 'Таблица % очищена.', t_name;
 EXCEPTION
   WHEN OTHERS THEN
@@ -338,12 +766,234 @@ $$ LANGUAGE plpgsql;
 CREATE OR REPLACE FUNCTION delivery_schema.add_info(p_order_id INT, p_product_id INT, p_quantity INT)
 RETURNS VOID AS $$
 BEGIN
-    INSERT INTO delivery_tables_schema.OrderItems(order_id, product_id, quantity) VALUES (p_order_id, p_product_id, p_quantity);
+    INSERT INTO delivery_tables_schema.OrderItems(order_id, order_date, product_id, quantity)
+    VALUES (
+        p_order_id,
+        (SELECT order_date FROM delivery_tables_schema.Orders WHERE order_id = p_order_id),
+        p_product_id,
+        p_quantity
+    );
 EXCEPTION WHEN OTHERS THEN
     RAISE EXCEPTION 'Ошибка при добавлении пользователя: %', SQLERRM;
 END;
 $$ LANGUAGE plpgsql;
 
+--Пакетное добавление данных: массивы одинаковой длины, один элемент = одна строка
+--Вся пачка вставляется одним INSERT ... SELECT FROM unnest и возвращается число добавленных строк
+--EXAMPLE: SELECT add_info_batch(ARRAY['Levchik']::varchar[], ARRAY['lew.cherezow@gmail.com']::varchar[], ARRAY['228']::varchar[], ARRAY['sormovo']::varchar[])
+CREATE OR REPLACE FUNCTION delivery_schema.add_info_batch(p_names VARCHAR[], p_emails VARCHAR[], p_phones VARCHAR[], p_addresses VARCHAR[])
+RETURNS INT AS $$
+DECLARE
+    inserted INT;
+BEGIN
+    INSERT INTO delivery_tables_schema.Users(name, email, phone, address)
+    SELECT * FROM unnest(p_names, p_emails, p_phones, p_addresses);
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном добавлении пользователей: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION delivery_schema.add_info_batch(p_names VARCHAR[], p_descriptions TEXT[], p_prices INT[], p_stocks INT[])
+RETURNS INT AS $$
+DECLARE
+    inserted INT;
+BEGIN
+    INSERT INTO delivery_tables_schema.Products(name, description, price, stock)
+    SELECT * FROM unnest(p_names, p_descriptions, p_prices, p_stocks);
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном добавлении товаров: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION delivery_schema.add_info_batch(p_user_ids INT[], p_statuses VARCHAR[])
+RETURNS INT AS $$
+DECLARE
+    inserted INT;
+BEGIN
+    INSERT INTO delivery_tables_schema.Orders(user_id, status)
+    SELECT * FROM unnest(p_user_ids, p_statuses);
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном добавлении заказов: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION delivery_schema.add_info_batch(p_order_ids INT[], p_product_ids INT[], p_quantities INT[])
+RETURNS INT AS $$
+DECLARE
+    inserted INT;
+BEGIN
+    INSERT INTO delivery_tables_schema.OrderItems(order_id, order_date, product_id, quantity, unit_price)
+    SELECT u.order_id, o.order_date, u.product_id, u.quantity, p.price
+    FROM unnest(p_order_ids, p_product_ids, p_quantities) AS u(order_id, product_id, quantity)
+    LEFT JOIN delivery_tables_schema.Orders o ON o.order_id = u.order_id
+    LEFT JOIN delivery_tables_schema.Products p ON p.product_id = u.product_id;
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном добавлении позиций заказа: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Временная таблица для загрузки файлов через COPY (своя в каждой сессии, очищается при COMMIT)
+CREATE OR REPLACE PROCEDURE delivery_schema.prepare_staging_table(t_name TEXT)
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF t_name = 'users' THEN
+        CREATE TEMP TABLE IF NOT EXISTS staging_users (
+            staging_row BIGINT GENERATED ALWAYS AS IDENTITY,
+            user_id INT,
+            name VARCHAR(50),
+            email VARCHAR(50),
+            phone VARCHAR(15),
+            address VARCHAR(100)
+        ) ON COMMIT DELETE ROWS;
+    ELSIF t_name = 'products' THEN
+        CREATE TEMP TABLE IF NOT EXISTS staging_products (
+            staging_row BIGINT GENERATED ALWAYS AS IDENTITY,
+            product_id INT,
+            name VARCHAR(100),
+            description TEXT,
+            price INT,
+            stock INT
+        ) ON COMMIT DELETE ROWS;
+    ELSIF t_name = 'orders' THEN
+        CREATE TEMP TABLE IF NOT EXISTS staging_orders (
+            staging_row BIGINT GENERATED ALWAYS AS IDENTITY,
+            order_id INT,
+            user_id INT,
+            status VARCHAR(20)
+        ) ON COMMIT DELETE ROWS;
+    ELSIF t_name = 'orderitems' THEN
+        CREATE TEMP TABLE IF NOT EXISTS staging_orderitems (
+            staging_row BIGINT GENERATED ALWAYS AS IDENTITY,
+            order_item_id INT,
+            order_id INT,
+            product_id INT,
+            quantity INT
+        ) ON COMMIT DELETE ROWS;
+    ELSE
+        RAISE EXCEPTION 'Table "%" is not allowed for staging.', t_name;
+    END IF;
+END;
+$$;
+
+-- Перенос загруженной пачки из временной таблицы в основную
+-- Строки с ключом обновляют существующие записи (пустые поля не меняются), остальные добавляются.
+-- Пользователи без ключа сопоставляются по email (upsert). При повторах ключа побеждает последняя строка файла.
+CREATE OR REPLACE FUNCTION delivery_schema.merge_staging_table(t_name TEXT)
+RETURNS INT AS $$
+DECLARE
+    updated INT := 0;
+    inserted INT := 0;
+BEGIN
+    IF t_name = 'users' THEN
+        UPDATE delivery_tables_schema.Users u
+        SET name = COALESCE(s.name, u.name),
+            email = COALESCE(s.email, u.email),
+            phone = COALESCE(s.phone, u.phone),
+            address = COALESCE(s.address, u.address)
+        FROM (
+            SELECT DISTINCT ON (user_id) * FROM pg_temp.staging_users
+            WHERE user_id IS NOT NULL
+            ORDER BY user_id, staging_row DESC
+        ) s
+        WHERE u.user_id = s.user_id;
+        GET DIAGNOSTICS updated = ROW_COUNT;
+
+        INSERT INTO delivery_tables_schema.Users(name, email, phone, address)
+        SELECT s.name, s.email, s.phone, s.address
+        FROM (
+            SELECT DISTINCT ON (email) * FROM pg_temp.staging_users
+            WHERE email IS NOT NULL
+            ORDER BY email, staging_row DESC
+        ) s
+        WHERE s.user_id IS NULL
+        ON CONFLICT (email) DO UPDATE
+        SET name = EXCLUDED.name, phone = EXCLUDED.phone, address = EXCLUDED.address;
+        GET DIAGNOSTICS inserted = ROW_COUNT;
+        updated := updated + inserted;
+
+        INSERT INTO delivery_tables_schema.Users(name, email, phone, address)
+        SELECT s.name, s.email, s.phone, s.address
+        FROM pg_temp.staging_users s
+        WHERE s.user_id IS NULL AND s.email IS NULL;
+        GET DIAGNOSTICS inserted = ROW_COUNT;
+    ELSIF t_name = 'products' THEN
+        UPDATE delivery_tables_schema.Products p
+        SET name = COALESCE(s.name, p.name),
+            description = COALESCE(s.description, p.description),
+            price = COALESCE(s.price, p.price),
+            stock = COALESCE(s.stock, p.stock)
+        FROM (
+            SELECT DISTINCT ON (product_id) * FROM pg_temp.staging_products
+            WHERE product_id IS NOT NULL
+            ORDER BY product_id, staging_row DESC
+        ) s
+        WHERE p.product_id = s.product_id;
+        GET DIAGNOSTICS updated = ROW_COUNT;
+
+        INSERT INTO delivery_tables_schema.Products(name, description, price, stock)
+        SELECT s.name, s.description, s.price, s.stock
+        FROM pg_temp.staging_products s
+        WHERE s.product_id IS NULL;
+        GET DIAGNOSTICS inserted = ROW_COUNT;
+    ELSIF t_name = 'orders' THEN
+        UPDATE delivery_tables_schema.Orders o
+        SET user_id = COALESCE(s.user_id, o.user_id),
+            status = COALESCE(s.status, o.status)
+        FROM (
+            SELECT DISTINCT ON (order_id) * FROM pg_temp.staging_orders
+            WHERE order_id IS NOT NULL
+            ORDER BY order_id, staging_row DESC
+        ) s
+        WHERE o.order_id = s.order_id;
+        GET DIAGNOSTICS updated = ROW_COUNT;
+
+        INSERT INTO delivery_tables_schema.Orders(user_id, status)
+        SELECT s.user_id, s.status
+        FROM pg_temp.staging_orders s
+        WHERE s.order_id IS NULL;
+        GET DIAGNOSTICS inserted = ROW_COUNT;
+    ELSIF t_name = 'orderitems' THEN
+        UPDATE delivery_tables_schema.OrderItems oi
+        SET order_id = COALESCE(s.order_id, oi.order_id),
+            order_date = COALESCE(
+                (SELECT o.order_date FROM delivery_tables_schema.Orders o WHERE o.order_id = s.order_id),
+                oi.order_date
+            ),
+            product_id = COALESCE(s.product_id, oi.product_id),
+            quantity = COALESCE(s.quantity, oi.quantity)
+        FROM (
+            SELECT DISTINCT ON (order_item_id) * FROM pg_temp.staging_orderitems
+            WHERE order_item_id IS NOT NULL
+            ORDER BY order_item_id, staging_row DESC
+        ) s
+        WHERE oi.order_item_id = s.order_item_id;
+        GET DIAGNOSTICS updated = ROW_COUNT;
+
+        INSERT INTO delivery_tables_schema.OrderItems(order_id, order_date, product_id, quantity, unit_price)
+        SELECT s.order_id, o.order_date, s.product_id, s.quantity, p.price
+        FROM pg_temp.staging_orderitems s
+        LEFT JOIN delivery_tables_schema.Orders o ON o.order_id = s.order_id
+        LEFT JOIN delivery_tables_schema.Products p ON p.product_id = s.product_id
+        WHERE s.order_item_id IS NULL;
+        GET DIAGNOSTICS inserted = ROW_COUNT;
+    ELSE
+        RAISE EXCEPTION 'Table "%" is not allowed for staging.', t_name;
+    END IF;
+
+    RETURN updated + inserted;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при переносе данных в таблицу %: %', t_name, SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Поиск по заданному полю description в таблице Products
 CREATE OR REPLACE FUNCTION delivery_schema.search_products_by_desc(p_desc TEXT)
 RETURNS TABLE(product_id INT, name VARCHAR(100), description TEXT, price INT, stock INT) AS $$
@@ -362,6 +1012,89 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Поиск товаров по описанию с ранжированием, лимитом и постраничным выводом по ключу
+-- p_mode: 'substring' (ILIKE по подстроке), 'prefix' (описание начинается с запроса)
+-- или 'fulltext' (полнотекстовый поиск). Следующая страница: p_after_rank и p_after_id
+-- последней строки предыдущей страницы.
+CREATE OR REPLACE FUNCTION delivery_schema.search_products(
+    p_query TEXT,
+    p_mode TEXT DEFAULT 'substring',
+    p_limit INT DEFAULT 50,
+    p_after_rank REAL DEFAULT NULL,
+    p_after_id INT DEFAULT NULL
+)
+RETURNS TABLE(product_id INT, name VARCHAR(100), description TEXT, price INT, stock INT, rank REAL) AS $$
+DECLARE
+    -- Экранируем спецсимволы LIKE, чтобы запрос искался как обычный текст
+    v_pattern TEXT := replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_');
+BEGIN
+    IF p_mode = 'fulltext' THEN
+        RETURN QUERY
+        SELECT r.product_id, r.name, r.description, r.price, r.stock, r.rank
+        FROM (
+            SELECT p.product_id, p.name, p.description, p.price, p.stock,
+                   ts_rank(to_tsvector('simple', COALESCE(p.description, '')), q.query) AS rank
+            FROM delivery_tables_schema.Products p,
+                 websearch_to_tsquery('simple', p_query) AS q(query)
+            WHERE to_tsvector('simple', COALESCE(p.description, '')) @@ q.query
+        ) r
+        WHERE p_after_id IS NULL OR (r.rank, r.product_id) < (p_after_rank, p_after_id)
+        ORDER BY r.rank DESC, r.product_id DESC
+        LIMIT p_limit;
+    ELSIF p_mode IN ('substring', 'prefix') THEN
+        IF p_mode = 'prefix' THEN
+            v_pattern := v_pattern || '%';
+        ELSE
+            v_pattern := '%' || v_pattern || '%';
+        END IF;
+
+        RETURN QUERY
+        SELECT r.product_id, r.name, r.description, r.price, r.stock, r.rank
+        FROM (
+            SELECT p.product_id, p.name, p.description, p.price, p.stock,
+                   similarity(p.description, p_query) AS rank
+            FROM delivery_tables_schema.Products p
+            WHERE p.description ILIKE v_pattern
+        ) r
+        WHERE p_after_id IS NULL OR (r.rank, r.product_id) < (p_after_rank, p_after_id)
+        ORDER BY r.rank DESC, r.product_id DESC
+        LIMIT p_limit;
+    ELSE
+        RAISE EXCEPTION 'Search mode "%" is not supported.', p_mode;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Подсказки по началу имени товара или пользователя (typeahead)
+-- Условие задано диапазоном операторов ~>=~ / ~<~, поэтому индекс text_pattern_ops
+-- используется и в общем плане с параметрами, а ORDER BY ... USING ~<~ читает
+-- первые p_limit совпадений прямо в порядке индекса без сортировки.
+CREATE OR REPLACE FUNCTION delivery_schema.suggest_product_names(p_prefix TEXT, p_limit INT DEFAULT 10)
+RETURNS TABLE(product_id INT, name VARCHAR(100)) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT p.product_id, p.name
+    FROM delivery_tables_schema.Products p
+    WHERE lower(p.name) ~>=~ lower(p_prefix)
+      AND lower(p.name) ~<~ (lower(p_prefix) || chr(1114111))
+    ORDER BY lower(p.name) USING ~<~
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION delivery_schema.suggest_user_names(p_prefix TEXT, p_limit INT DEFAULT 10)
+RETURNS TABLE(user_id INT, name VARCHAR(50)) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT u.user_id, u.name
+    FROM delivery_tables_schema.Users u
+    WHERE lower(u.name) ~>=~ lower(p_prefix)
+      AND lower(u.name) ~<~ (lower(p_prefix) || chr(1114111))
+    ORDER BY lower(u.name) USING ~<~
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql;
+
 --Обновление кортежа
 CREATE OR REPLACE FUNCTION delivery_schema.update_cortege(p_user_id INT, p_name VARCHAR(50), p_email VARCHAR(50), p_phone VARCHAR(15),p_address VARCHAR(100))
 RETURNS VOID AS $$
@@ -419,14 +1152,115 @@ EXCEPTION WHEN OTHERS THEN
 END;
 $$ LANGUAGE plpgsql;
 
+--Пакетное обновление кортежей: массивы одинаковой длины, первый массив - айди строк
+--Вся пачка обновляется одним UPDATE ... FROM unnest, NULL в массиве означает "не менять поле".
+--Строки, в которых ничего не меняется, и несуществующие айди пропускаются,
+--возвращается число обновленных строк
+--EXAMPLE: SELECT update_cortege_batch(ARRAY[1]::int[], ARRAY[NULL]::varchar[], ARRAY[NULL]::text[], ARRAY[150]::int[], ARRAY[NULL]::int[])
+CREATE OR REPLACE FUNCTION delivery_schema.update_cortege_batch(p_user_ids INT[], p_names VARCHAR[], p_emails VARCHAR[], p_phones VARCHAR[], p_addresses VARCHAR[])
+RETURNS INT AS $$
+DECLARE
+    updated INT;
+BEGIN
+    UPDATE delivery_tables_schema.Users AS t
+    SET name = COALESCE(u.name, t.name),
+        email = COALESCE(u.email, t.email),
+        phone = COALESCE(u.phone, t.phone),
+        address = COALESCE(u.address, t.address)
+    FROM unnest(p_user_ids, p_names, p_emails, p_phones, p_addresses)
+        AS u(user_id, name, email, phone, address)
+    WHERE t.user_id = u.user_id
+      AND (COALESCE(u.name, t.name), COALESCE(u.email, t.email),
+           COALESCE(u.phone, t.phone), COALESCE(u.address, t.address))
+          IS DISTINCT FROM (t.name, t.email, t.phone, t.address);
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном изменении пользователей: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION delivery_schema.update_cortege_batch(p_product_ids INT[], p_names VARCHAR[], p_descriptions TEXT[], p_prices INT[], p_stocks INT[])
+RETURNS INT AS $$
+DECLARE
+    updated INT;
+BEGIN
+    UPDATE delivery_tables_schema.Products AS t
+    SET name = COALESCE(u.name, t.name),
+        description = COALESCE(u.description, t.description),
+        price = COALESCE(u.price, t.price),
+        stock = COALESCE(u.stock, t.stock)
+    FROM unnest(p_product_ids, p_names, p_descriptions, p_prices, p_stocks)
+        AS u(product_id, name, description, price, stock)
+    WHERE t.product_id = u.product_id
+      AND (COALESCE(u.name, t.name), COALESCE(u.description, t.description),
+           COALESCE(u.price, t.price), COALESCE(u.stock, t.stock))
+          IS DISTINCT FROM (t.name, t.description, t.price, t.stock);
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном изменении товаров: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION delivery_schema.update_cortege_batch(p_order_ids INT[], p_user_ids INT[], p_statuses VARCHAR[])
+RETURNS INT AS $$
+DECLARE
+    updated INT;
+BEGIN
+    UPDATE delivery_tables_schema.Orders AS t
+    SET user_id = COALESCE(u.user_id, t.user_id),
+        status = COALESCE(u.status, t.status)
+    FROM unnest(p_order_ids, p_user_ids, p_statuses) AS u(order_id, user_id, status)
+    WHERE t.order_id = u.order_id
+      AND (COALESCE(u.user_id, t.user_id), COALESCE(u.status, t.status))
+          IS DISTINCT FROM (t.user_id, t.status);
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном изменении заказов: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION delivery_schema.update_cortege_batch(p_order_item_ids INT[], p_order_ids INT[], p_product_ids INT[], p_quantities INT[])
+RETURNS INT AS $$
+DECLARE
+    updated INT;
+BEGIN
+    UPDATE delivery_tables_schema.OrderItems AS t
+    SET order_id = COALESCE(u.order_id, t.order_id),
+        order_date = COALESCE(
+            (SELECT o.order_date FROM delivery_tables_schema.Orders o WHERE o.order_id = u.order_id),
+            t.order_date
+        ),
+        product_id = COALESCE(u.product_id, t.product_id),
+        quantity = COALESCE(u.quantity, t.quantity)
+    FROM unnest(p_order_item_ids, p_order_ids, p_product_ids, p_quantities)
+        AS u(order_item_id, order_id, product_id, quantity)
+    WHERE t.order_item_id = u.order_item_id
+      AND (COALESCE(u.order_id, t.order_id), COALESCE(u.product_id, t.product_id),
+           COALESCE(u.quantity, t.quantity))
+          IS DISTINCT FROM (t.order_id, t.product_id, t.quantity);
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при пакетном изменении позиций заказа: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Очистка всех таблиц
-CREATE OR REPLACE PROCEDURE delivery_schema.clear_all_tables()
+-- p_fast = true: все таблицы очищаются одним TRUNCATE без построчных триггеров
+CREATE OR REPLACE PROCEDURE delivery_schema.clear_all_tables(p_fast BOOLEAN DEFAULT false)
 LANGUAGE plpgsql AS $$
 BEGIN
-  DELETE FROM delivery_tables_schema.Users;
-  DELETE FROM delivery_tables_schema.Orders;
-  DELETE FROM delivery_tables_schema.OrderItems;
-  DELETE FROM delivery_tables_schema.Products;
+  IF p_fast THEN
+    CALL delivery_schema.truncate_tables();
+  ELSE
+    DELETE FROM delivery_tables_schema.Users;
+    DELETE FROM delivery_tables_schema.Orders;
+    DELETE FROM delivery_tables_schema.OrderItems;
+    DELETE FROM delivery_tables_schema.Products;
+  END IF;
   RAISE NOTICE 'Таблицы в схеме delivery_schema очищены.';
 EXCEPTION WHEN OTHERS THEN
   RAISE EXCEPTION 'Ошибка при очистке таблиц в схеме delivery_schema: %', SQLERRM;
@@ -434,21 +1268,17 @@ END;
 $$;
 
 -- Удаление по заданному полю description в таблице Products
-CREATE OR REPLACE PROCEDURE delivery_schema.delete_products_by_desc(p_desc TEXT)
+-- Удаление выполняется одним DELETE, в p_deleted возвращается число удаленных товаров
+CREATE OR REPLACE PROCEDURE delivery_schema.delete_products_by_desc(p_desc TEXT, INOUT p_deleted INT DEFAULT NULL)
 LANGUAGE plpgsql AS $$
 DECLARE
   v_desc TEXT;
-  rec RECORD;
 BEGIN
   v_desc:= '%' || p_desc || '%';
 
-  FOR rec IN SELECT product_id, name, description, price, stock
-  FROM delivery_tables_schema.Products
-  WHERE description ILIKE v_desc
-  LOOP
-    DELETE FROM delivery_tables_schema.Products
-    WHERE product_id = rec.product_id;
-  END LOOP;
+  DELETE FROM delivery_tables_schema.Products
+  WHERE description ILIKE v_desc;
+  GET DIAGNOSTICS p_deleted = ROW_COUNT;
 
 EXCEPTION WHEN OTHERS THEN
   RAISE EXCEPTION 'Ошибка при поиске товаров: %', SQLERRM;
@@ -478,12 +1308,192 @@ EXCEPTION
 END;
 $$;
 
+-- Удаление набора записей по списку айди одним DELETE
+-- Возвращает число удаленных записей (без учета каскадно удаленных)
+CREATE OR REPLACE FUNCTION delivery_schema.delete_records(t_name TEXT, p_ids INT[])
+RETURNS INT AS $$
+DECLARE
+    deleted INT;
+BEGIN
+    IF t_name = 'users' THEN
+        DELETE FROM delivery_tables_schema.Users WHERE user_id = ANY(p_ids);
+    ELSIF t_name = 'products' THEN
+        DELETE FROM delivery_tables_schema.Products WHERE product_id = ANY(p_ids);
+    ELSIF t_name = 'orderitems' THEN
+        DELETE FROM delivery_tables_schema.OrderItems WHERE order_item_id = ANY(p_ids);
+    ELSIF t_name = 'orders' THEN
+        DELETE FROM delivery_tables_schema.Orders WHERE order_id = ANY(p_ids);
+    ELSE
+        RAISE EXCEPTION 'Table "%" is not allowed for deletion.', t_name;
+    END IF;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN deleted;
+EXCEPTION
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Error while deleting records: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Захват следующих ожидающих заказов диспетчером доставки.
+-- Строки, уже заблокированные другими диспетчерами, пропускаются (SKIP LOCKED), поэтому
+-- параллельные диспетчеры не ждут друг друга и не получают одни и те же заказы
+--EXAMPLE: SELECT * FROM claim_orders('courier-1', 10)
+CREATE OR REPLACE FUNCTION delivery_schema.claim_orders(p_worker VARCHAR(50), p_limit INT DEFAULT 10)
+RETURNS TABLE(order_id INT, user_id INT, order_date TIMESTAMP, total_cost INT) AS $$
+BEGIN
+    RETURN QUERY
+    WITH next_orders AS (
+        SELECT o.order_id
+        FROM delivery_tables_schema.Orders o
+        WHERE o.status = 'Pending'
+        ORDER BY o.order_date
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE delivery_tables_schema.Orders o
+    SET status = 'Dispatching', claimed_by = p_worker, claimed_at = CURRENT_TIMESTAMP
+    FROM next_orders
+    WHERE o.order_id = next_orders.order_id
+    RETURNING o.order_id, o.user_id, o.order_date, o.total_cost;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при захвате заказов: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Завершение доставки захваченных заказов. Если задан диспетчер, завершаются только его заказы.
+-- Возвращает число завершенных заказов
+CREATE OR REPLACE FUNCTION delivery_schema.complete_orders(p_order_ids INT[], p_worker VARCHAR(50) DEFAULT NULL)
+RETURNS INT AS $$
+DECLARE
+    completed INT;
+BEGIN
+    UPDATE delivery_tables_schema.Orders
+    SET status = 'Completed'
+    WHERE order_id = ANY(p_order_ids)
+      AND status = 'Dispatching'
+      AND (p_worker IS NULL OR claimed_by = p_worker);
+    GET DIAGNOSTICS completed = ROW_COUNT;
+    RETURN completed;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при завершении заказов: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перенос одной пачки заказов старше p_older_than (по умолчанию только завершенных,
+-- при p_status = NULL - любых) вместе с позициями в схему delivery_archive.
+-- Каждый вызов - отдельная короткая транзакция; повторный вызов продолжает с оставшихся заказов.
+-- На время переноса выставляется delivery.archiving, чтобы триггеры удаления позиций
+-- не возвращали товар на склад и не пересчитывали стоимость удаляемых заказов.
+-- Заказы, заблокированные другими транзакциями (например, диспетчерами), пропускаются
+--EXAMPLE: SELECT * FROM archive_orders('2025-01-01', 1000)
+CREATE OR REPLACE FUNCTION delivery_schema.archive_orders(p_older_than TIMESTAMP, p_batch_size INT DEFAULT 1000, p_status VARCHAR(20) DEFAULT 'Completed')
+RETURNS TABLE(archived_orders INT, archived_items INT) AS $$
+DECLARE
+    v_order_ids INT[];
+    v_order_dates TIMESTAMP[];
+    v_orders INT;
+    v_items INT;
+BEGIN
+    SELECT array_agg(batch.order_id), array_agg(batch.order_date)
+    INTO v_order_ids, v_order_dates
+    FROM (
+        SELECT o.order_id, o.order_date
+        FROM delivery_tables_schema.Orders o
+        WHERE o.order_date < p_older_than
+          AND (p_status IS NULL OR o.status = p_status)
+        ORDER BY o.order_date
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    ) batch;
+
+    IF v_order_ids IS NULL THEN
+        RETURN QUERY SELECT 0, 0;
+        RETURN;
+    END IF;
+
+    PERFORM set_config('delivery.archiving', 'on', true);
+
+    WITH moved AS (
+        DELETE FROM delivery_tables_schema.OrderItems oi
+        USING unnest(v_order_ids, v_order_dates) AS b(order_id, order_date)
+        WHERE oi.order_id = b.order_id AND oi.order_date = b.order_date
+        RETURNING oi.order_item_id, oi.order_id, oi.order_date, oi.product_id, oi.quantity, oi.unit_price
+    )
+    INSERT INTO delivery_archive.OrderItems(order_item_id, order_id, order_date, product_id, quantity, unit_price)
+    SELECT * FROM moved;
+    GET DIAGNOSTICS v_items = ROW_COUNT;
+
+    WITH moved AS (
+        DELETE FROM delivery_tables_schema.Orders o
+        USING unnest(v_order_ids, v_order_dates) AS b(order_id, order_date)
+        WHERE o.order_id = b.order_id AND o.order_date = b.order_date
+        RETURNING o.order_id, o.user_id, o.order_date, o.total_cost, o.status, o.claimed_by, o.claimed_at
+    )
+    INSERT INTO delivery_archive.Orders(order_id, user_id, order_date, total_cost, status, claimed_by, claimed_at)
+    SELECT * FROM moved;
+    GET DIAGNOSTICS v_orders = ROW_COUNT;
+
+    PERFORM set_config('delivery.archiving', 'off', true);
+
+    RETURN QUERY SELECT v_orders, v_items;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при переносе заказов в архив: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Оформление заказа за один вызов: заказ и все позиции создаются в одной транзакции.
+-- Товары блокируются в порядке product_id, поэтому параллельные заказы с одними и теми же
+-- товарами ждут друг друга, а не взаимоблокируются. Возвращает айди заказа и его стоимость
+--EXAMPLE: SELECT * FROM place_order(1, '[{"product_id": 1, "quantity": 2}, {"product_id": 3, "quantity": 1}]')
+CREATE OR REPLACE FUNCTION delivery_schema.place_order(p_user_id INT, p_items JSONB)
+RETURNS TABLE(order_id INT, total_cost INT) AS $$
+DECLARE
+    v_order_id INT;
+    v_order_date TIMESTAMP;
+BEGIN
+    IF jsonb_typeof(p_items) IS DISTINCT FROM 'array' OR jsonb_array_length(p_items) = 0 THEN
+        RAISE EXCEPTION 'Заказ должен содержать хотя бы одну позицию';
+    END IF;
+
+    PERFORM 1
+    FROM delivery_tables_schema.Products p
+    WHERE p.product_id IN (
+        SELECT item.product_id FROM jsonb_to_recordset(p_items) AS item(product_id INT)
+    )
+    ORDER BY p.product_id
+    FOR UPDATE;
+
+    INSERT INTO delivery_tables_schema.Orders AS o (user_id, status)
+    VALUES (p_user_id, 'Created')
+    RETURNING o.order_id, o.order_date INTO v_order_id, v_order_date;
+
+    -- Стоимость заказа и остатки товаров обновляют триггеры уровня оператора
+    INSERT INTO delivery_tables_schema.OrderItems(order_id, order_date, product_id, quantity, unit_price)
+    SELECT v_order_id, v_order_date, item.product_id, item.quantity, p.price
+    FROM jsonb_to_recordset(p_items) AS item(product_id INT, quantity INT)
+    LEFT JOIN delivery_tables_schema.Products p ON p.product_id = item.product_id;
+
+    RETURN QUERY
+    SELECT o.order_id, o.total_cost
+    FROM delivery_tables_schema.Orders o
+    WHERE o.order_id = v_order_id AND o.order_date = v_order_date;
+EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'Ошибка при оформлении заказа: %', SQLERRM;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Месячные секции заказов на текущий и три следующих месяца.
+-- Создаются до выдачи прав, чтобы GRANT ON ALL TABLES распространился и на них
+CALL delivery_init_schema.create_order_partitions();
+
 -- Даем доступ пользователю chill_user к схеме с таблицами
 GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA delivery_tables_schema TO chill_user;
 GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA delivery_tables_schema TO chill_user;
 GRANT USAGE ON SCHEMA delivery_tables_schema TO chill_user;
 GRANT USAGE ON SCHEMA delivery_schema TO chill_user;
 GRANT USAGE ON SCHEMA delivery_init_schema TO chill_user;
+GRANT USAGE ON SCHEMA delivery_archive TO chill_user;
+GRANT SELECT, INSERT ON ALL TABLES IN SCHEMA delivery_archive TO chill_user;
 
 -- -- Заполнение таблиц
 
@@ -500,5 +1510,5 @@ GRANT USAGE ON SCHEMA delivery_init_schema TO chill_user;
 -- VALUES (1, 'Created');
 
 -- -- Добавляем элемент заказа в таблицу OrderItems
--- INSERT INTO delivery_tables_schema.OrderItems (order_id, product_id, quantity)
--- VALUES (1, 1, 2);
+-- INSERT INTO delivery_tables_schema.OrderItems (order_id, order_date, product_id, quantity)
+-- SELECT order_id, order_date, 1, 2 FROM delivery_tables_schema.Orders WHERE order_id = 1;
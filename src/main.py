@@ -17,6 +17,11 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 
 
 class GUIDispatcherBD:
+    # Административное подключение и результат проверки существования базы
+    # кешируются на все время работы процесса
+    _admin_connection = None
+    _database_exists = None
+
     def __init__(self) -> None:
         self.root = tk.Tk()
         self.root.title("Login to Database")
@@ -68,22 +73,32 @@ class GUIDispatcherBD:
         self.db_manager = DatabaseManager(DB_NAME, login, password, DB_HOST, DB_PORT)
         return True
 
+    @classmethod
+    def admin_connection(cls):
+        if cls._admin_connection is None:
+            cls._admin_connection = DatabaseManager(
+                "postgres", "postgres", "", DB_HOST, DB_PORT
+            )
+        return cls._admin_connection
+
     @dbconnect_logger
     def database_exists(self):
-        admin_connection = DatabaseManager("postgres", "postgres", "", DB_HOST, DB_PORT)
-        admin_connection.cursor.execute(
-            f"SELECT 1 FROM pg_database WHERE datname = '{DB_NAME}'"
-        )
-        checker_exist = admin_connection.cursor.fetchone() is not None
-        admin_connection.close()
-        return checker_exist
+        if GUIDispatcherBD._database_exists is None:
+            admin_connection = self.admin_connection()
+            admin_connection.cursor.execute(
+                "SELECT 1 FROM pg_database WHERE datname = %s", (DB_NAME,)
+            )
+            GUIDispatcherBD._database_exists = (
+                admin_connection.cursor.fetchone() is not None
+            )
+        return GUIDispatcherBD._database_exists
 
     @dbconnect_logger
     def initialize_database(self):
-        connect_admin = DatabaseManager("postgres", "postgres", "", DB_HOST, DB_PORT)
+        connect_admin = self.admin_connection()
         connect_admin.cursor.execute(f"CREATE DATABASE {DB_NAME}")
         logging.info(f"Database '{DB_NAME}' created successfully.")
-        connect_admin.close()
+        GUIDispatcherBD._database_exists = True
 
         command = [
             "psql",
@@ -137,6 +152,9 @@ class GUIDispatcherBD:
                     self.__request_table_name(command)
                 else:
                     command()
+                    if command == self.db_manager.delete_database:
+                        # После удаления базы кеш проверки существования устарел
+                        GUIDispatcherBD._database_exists = None
                     messagebox.showinfo("Success", success_message)
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -1,10 +1,16 @@
+import ast
 import os
+import shutil
+import time
+import uuid
 
+import columnar
+import maintenance
 import pandas as pd
-from db_procedures import DatabaseManager
+from db_procedures import DatabaseManager, acquire_engine
 from dotenv import load_dotenv
 from logger import logging, logs
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 import streamlit as st
@@ -17,6 +23,50 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Выгрузки отдаются с диска статическим сервером Streamlit (server.enableStaticServing)
+# по адресу app/static/exports/<токен>/<файл> и удаляются через EXPORT_TTL секунд
+EXPORT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "static", "exports"
+)
+EXPORT_TTL = 3600
+MAINTENANCE_ANALYZE_ROWS = int(
+    os.getenv("MAINTENANCE_ANALYZE_ROWS", str(maintenance.ANALYZE_THRESHOLD))
+)
+MAINTENANCE_VACUUM_ROWS = int(
+    os.getenv("MAINTENANCE_VACUUM_ROWS", str(maintenance.VACUUM_THRESHOLD))
+)
+MAINTENANCE_REINDEX_MIN_DENSITY = float(
+    os.getenv(
+        "MAINTENANCE_REINDEX_MIN_DENSITY", str(maintenance.REINDEX_MIN_LEAF_DENSITY)
+    )
+)
+
+
+@st.cache_resource
+def get_admin_engine():
+    """Admin engine shared by the whole process."""
+    return acquire_engine(
+        f"postgresql://{ADMIN_USERNAME}:{ADMIN_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        pool_size=1,
+        max_overflow=1,
+    )
+
+
+@st.cache_data(show_spinner=False)
+def check_database_existence():
+    """Process-wide cached result of check_database_existence().
+
+    Errors are raised, so a failed check is not cached. Call
+    check_database_existence.clear() after the database is created or deleted.
+    """
+    with get_admin_engine().connect() as conn:
+        query = text("SELECT delivery_init_schema.check_database_existence();")
+        return conn.execute(query).scalar()
 
 
 class StreamlitDatabaseApp:
@@ -59,8 +109,25 @@ class StreamlitDatabaseApp:
                 "db_manager" not in st.session_state
                 or st.session_state.db_manager is None
             ):
+                # Пул соединений общий для всех сессий с одинаковыми учетными данными
                 self.db_manager = DatabaseManager(
-                    DB_NAME, login, password, DB_HOST, DB_PORT
+                    DB_NAME,
+                    login,
+                    password,
+                    DB_HOST,
+                    DB_PORT,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_POOL_MAX_OVERFLOW,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    # VACUUM и REINDEX может выполнять только владелец таблиц
+                    auto_maintenance=True,
+                    maintenance_engine=get_admin_engine(),
+                    maintenance_settings={
+                        "analyze_threshold": MAINTENANCE_ANALYZE_ROWS,
+                        "vacuum_threshold": MAINTENANCE_VACUUM_ROWS,
+                        "reindex_min_density": MAINTENANCE_REINDEX_MIN_DENSITY,
+                    },
                 )
                 st.session_state.db_manager = self.db_manager
             else:
@@ -69,7 +136,13 @@ class StreamlitDatabaseApp:
             logging.debug(
                 f"Database type: {type(self.db_manager)} Database: {self.db_manager}"
             )
-            return self.db_manager.test_connection()  # Проверяем подключение
+            # Проверяем подключение
+            if self.db_manager.test_connection():
+                return True
+            # Пул с неверными учетными данными больше не нужен
+            self.db_manager.close(dispose=True)
+            st.session_state.db_manager = None
+            return False
         except Exception as e:
             logging.error(f"Error connecting to the database: {e}")
             st.error(f"Failed to connect to the database: {e}")
@@ -79,15 +152,8 @@ class StreamlitDatabaseApp:
     def database_exists(self):
         """Check if the database exists."""
         try:
-            # Подключаемся к базе данных chill_owner для проверки существования базы данных
-            admin_engine = create_engine(
-                f"postgresql://{ADMIN_USERNAME}:{ADMIN_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-                isolation_level="AUTOCOMMIT",
-            )
-            with admin_engine.connect() as conn:
-                query = text("SELECT delivery_init_schema.check_database_existence();")
-                result = conn.execute(query)
-                return result.fetchall()[0][0]
+            # Результат кешируется, поэтому при входе обычно не нужен запрос к базе
+            return check_database_existence()
         except SQLAlchemyError as e:
             logging.error(f"Error checking database existence: {e}")
             return False
@@ -97,14 +163,11 @@ class StreamlitDatabaseApp:
         """Initialize the database using SQL script."""
         try:
             # Подключаемся к базе данных chill_owner для создания базы данных
-            admin_engine = create_engine(
-                f"postgresql://{ADMIN_USERNAME}:{ADMIN_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-                isolation_level="AUTOCOMMIT",
-            )
-            with admin_engine.connect() as conn:
+            with get_admin_engine().connect() as conn:
                 conn.execute(
                     text("CALL delivery_init_schema.create_delivery_tables();")
                 )
+            check_database_existence.clear()
             logging.info("Database initialized successfully.")
             return True
         except Exception as e:
@@ -142,33 +205,64 @@ class StreamlitDatabaseApp:
             "Choose an operation",
             [
                 "Show Tables Content",
+                "Browse Table",
                 "Clear Table",
                 "Clear All Tables",
                 "Delete Database",
                 "Add Data",
+                "Place Order",
+                "Dispatch Orders",
+                "Bulk Import",
+                "Export Table",
                 "Search by Text Field",
                 "Update Row",
                 "Delete by Text Field",
                 "Delete Specific Record",
+                "Index Advisor",
+                "Maintenance",
             ],
             key="operation_selectbox",
         )
 
+        # Счетчики подготовленных операторов записи (общие для процесса)
+        with st.sidebar.expander("Prepared statements"):
+            st.dataframe(
+                pd.DataFrame.from_dict(
+                    self.db_manager.statement_stats(), orient="index"
+                )
+            )
+
         if operation == "Show Tables Content":
             logging.debug(
                 f"Database type: {type(self.db_manager)} Database: {self.db_manager}"
             )
-            result = self.db_manager.show_tables_content()
-            if result:
-                self.__show_results(result)
-            else:
+            summary = self.db_manager.show_tables_content(summary=True)
+            if not summary:
                 st.error("Database is empty.")
+            for table_name, estimated_rows, total_bytes in summary or []:
+                with st.expander(
+                    f"{table_name.capitalize()} - ~{estimated_rows} rows, "
+                    f"{self.__format_size(total_bytes)}"
+                ):
+                    # Строки читаются только по запросу, а не при каждом перезапуске
+                    if st.toggle("Load rows", key=f"load_rows_{table_name}"):
+                        rows = self.db_manager.show_table_content(
+                            table_name, result_format="arrow"
+                        )
+                        if rows:
+                            st.dataframe(rows)
+                        else:
+                            st.write("No results found.")
+
+        elif operation == "Browse Table":
+            self.__show_table_browser()
 
         elif operation == "Clear Table":
             table_name = st.text_input("Enter table name to clear")
+            fast = st.checkbox("Fast reset (TRUNCATE, also clears referencing tables)")
             if st.button("Clear Table"):
                 if table_name:
-                    if self.db_manager.clear_table(table_name):
+                    if self.db_manager.clear_table(table_name, fast):
                         st.success(f"Table '{table_name}' cleared successfully!")
                     else:
                         st.error(f"Failed to clear table '{table_name}'.")
@@ -176,14 +270,18 @@ class StreamlitDatabaseApp:
                     st.warning("Please enter a table name.")
 
         elif operation == "Clear All Tables":
+            fast = st.checkbox("Fast reset (TRUNCATE)")
             if st.button("Clear All Tables"):
-                self.db_manager.clear_all_tables()
-                st.success("All tables cleared successfully!")
+                if self.db_manager.clear_all_tables(fast):
+                    st.success("All tables cleared successfully!")
+                else:
+                    st.error("Failed to clear tables.")
 
         elif operation == "Delete Database":
             if st.button("Delete Database"):
                 logging.info("Button 'Delete Database' pressed")
                 self.db_manager.delete_database()
+                check_database_existence.clear()
                 st.success("Database deleted successfully!")
 
         elif operation == "Add Data":
@@ -193,15 +291,129 @@ class StreamlitDatabaseApp:
             )
             if st.button("Add Data"):
                 updates_dict = eval(updates)
-                if self.db_manager.add_data(table_name, updates_dict):
+                # Список словарей добавляем одной пачкой
+                if isinstance(updates_dict, list):
+                    report = self.db_manager.add_rows(table_name, updates_dict)
+                    if report and report["inserted"]:
+                        st.success(f"Added {report['inserted']} rows successfully!")
+                    else:
+                        st.error(f"Failed to add data to table '{table_name}'.")
+                    if report and report["rejected"]:
+                        st.warning(f"Rejected rows: {report['rejected']}")
+                elif self.db_manager.add_data(table_name, updates_dict):
                     st.success("Data added successfully!")
                 else:
                     st.error(f"Failed to add data to table '{table_name}'.")
 
+        elif operation == "Place Order":
+            self.__name_lookup("users", "order_user_lookup")
+            user_id = st.text_input("Enter user ID")
+            items = st.text_area(
+                "Enter items as JSON. For example: [{'product_id': 1, 'quantity': 2}, {'product_id': 3, 'quantity': 1}]"
+            )
+            if st.button("Place Order"):
+                try:
+                    result = self.db_manager.place_order(
+                        int(user_id), ast.literal_eval(items)
+                    )
+                except (SyntaxError, ValueError) as e:
+                    st.error(f"Invalid order: {e}")
+                    result = None
+                if result:
+                    order_id, total_cost = result
+                    st.success(
+                        f"Order '{order_id}' placed successfully! Total cost: {total_cost}"
+                    )
+                elif result is not None:
+                    st.error("Failed to place order.")
+
+        elif operation == "Dispatch Orders":
+            worker_id = st.text_input("Enter worker ID")
+            count = st.number_input("Orders to claim", min_value=1, value=10)
+            if st.button("Claim Orders"):
+                orders = self.db_manager.claim_orders(worker_id, int(count))
+                if orders:
+                    st.dataframe(pd.DataFrame([row._asdict() for row in orders]))
+                else:
+                    st.warning("No pending orders to claim.")
+
+            order_ids = st.text_input("Enter delivered order IDs separated by commas")
+            if st.button("Complete Orders"):
+                try:
+                    ids = [int(key) for key in order_ids.split(",") if key.strip()]
+                except ValueError:
+                    st.error(f"Invalid order IDs '{order_ids}'.")
+                    ids = []
+                if ids:
+                    completed = self.db_manager.complete_orders(ids, worker_id)
+                    if completed is False or completed is None:
+                        st.error("Failed to complete orders.")
+                    else:
+                        st.success(f"{completed} orders completed successfully!")
+
+        elif operation == "Bulk Import":
+            table_name = st.selectbox(
+                "Choose table to import into",
+                ["users", "products", "orders", "orderitems"],
+            )
+            uploaded_file = st.file_uploader(
+                "Upload CSV or Parquet file", type=["csv", "parquet"]
+            )
+            file_path = st.text_input("Or enter path to a file on the server")
+            if st.button("Import"):
+                source = uploaded_file or file_path
+                if not source:
+                    st.warning("Please upload a file or enter a path.")
+                else:
+                    progress_bar = st.progress(0.0, text="Importing...")
+
+                    def show_progress(rows, fraction):
+                        progress_bar.progress(
+                            fraction if fraction is not None else 0.0,
+                            text=f"Imported {rows} rows",
+                        )
+
+                    report = self.db_manager.ingest_file(
+                        table_name, source, progress_callback=show_progress
+                    )
+                    if report and "error" not in report:
+                        progress_bar.progress(
+                            1.0, text=f"Imported {report['rows']} rows"
+                        )
+                        st.success(
+                            f"Imported {report['rows']} rows into '{table_name}' "
+                            f"({report['merged']} rows merged)."
+                        )
+                    else:
+                        error = report["error"] if report else "unknown error"
+                        st.error(f"Failed to import file into '{table_name}': {error}")
+
+        elif operation == "Export Table":
+            table_name = st.selectbox(
+                "Choose table to export",
+                ["users", "products", "orders", "orderitems"],
+            )
+            file_format = st.selectbox("Choose format", ["csv", "parquet", "binary"])
+            if st.button("Prepare Export"):
+                export_url = self.__spool_export(table_name, file_format)
+                if export_url:
+                    # Файл скачивается браузером напрямую с диска, а не через память процесса
+                    st.markdown(
+                        f'<a href="{export_url}" download="{table_name}.{file_format}">'
+                        f"Download {table_name}.{file_format}</a>",
+                        unsafe_allow_html=True,
+                    )
+                else:
+                    st.error(f"Failed to export table '{table_name}'.")
+
         elif operation == "Search by Text Field":
             query = st.text_input("Search by text field in Products table")
+            mode = st.selectbox("Search mode", ["substring", "prefix", "fulltext"])
+            limit = st.number_input("Max results", min_value=1, value=50)
             if st.button("Search"):
-                result = self.db_manager.search_by_text_field(query)
+                result = self.db_manager.search_by_text_field(
+                    query, mode=mode, limit=int(limit)
+                )
                 if result:
                     self.__show_results(result)
                 else:
@@ -209,6 +421,7 @@ class StreamlitDatabaseApp:
 
         elif operation == "Update Row":
             table_name = st.text_input("Enter table name to update row")
+            self.__name_lookup(table_name, "update_lookup")
             row_id = st.text_input("Enter row ID to update")
             updates = st.text_area(
                 "Enter updates as JSON. For example: {'user_id': 1, 'name': 'New Name', 'email': 'new_email@example.com', 'phone': '1234567890', 'address': 'Moscow'}"
@@ -216,10 +429,20 @@ class StreamlitDatabaseApp:
             if st.button("Update Row"):
                 try:
                     updates_dict = eval(updates)
-                    result = self.db_manager.update_row(
-                        table_name, row_id, updates_dict
-                    )
-                    if result:
+                    # Список словарей с ключами строк обновляем одной пачкой
+                    if isinstance(updates_dict, list):
+                        report = self.db_manager.update_rows(table_name, updates_dict)
+                        if report and (report["updated"] or not report["rejected"]):
+                            st.success(
+                                f"Updated {report['updated']} rows successfully!"
+                            )
+                        else:
+                            st.error(f"Failed to update rows in table '{table_name}'.")
+                        if report and report["rejected"]:
+                            st.warning(f"Rejected rows: {report['rejected']}")
+                    elif self.db_manager.update_row(
+                        table_name, int(row_id), updates_dict
+                    ):
                         st.success(
                             f"Row '{row_id}' in table '{table_name}' updated successfully!"
                         )
@@ -234,17 +457,192 @@ class StreamlitDatabaseApp:
         elif operation == "Delete by Text Field":
             query = st.text_input("Enter text field value to delete")
             if st.button("Delete"):
-                self.db_manager.delete_by_text_field(query)
-                st.success(f"Records with text field '{query}' deleted successfully!")
+                deleted = self.db_manager.delete_by_text_field(query)
+                if deleted is False or deleted is None:
+                    st.error(f"Failed to delete records with text field '{query}'.")
+                else:
+                    st.success(
+                        f"{deleted} records with text field '{query}' deleted successfully!"
+                    )
+
+        elif operation == "Index Advisor":
+            advice = self.db_manager.index_advice()
+            if not advice:
+                st.error("Failed to collect index statistics.")
+            else:
+                st.subheader("Tables read mostly by sequential scans")
+                st.dataframe(pd.DataFrame(advice["seq_scan_tables"]))
+                st.subheader("Foreign keys without an index")
+                st.dataframe(pd.DataFrame(advice["unindexed_foreign_keys"]))
+                if advice["candidate_indexes"]:
+                    st.code(
+                        ";\n".join(advice["candidate_indexes"]) + ";", language="sql"
+                    )
+                st.subheader("Slowest statements")
+                if advice["slow_statements"]:
+                    st.dataframe(pd.DataFrame(advice["slow_statements"]))
+                else:
+                    st.write("pg_stat_statements is not available.")
+
+        elif operation == "Maintenance":
+            tables = st.multiselect(
+                "Tables to vacuum now (empty - tables past the thresholds)",
+                ["users", "products", "orders", "orderitems"],
+            )
+            if st.button("Run Maintenance"):
+                results = self.db_manager.run_maintenance(tables or None)
+                if not results:
+                    st.info("No tables need maintenance.")
+                elif any(result["error"] for result in results):
+                    st.error("Maintenance failed for some tables, see the log.")
+                else:
+                    st.success(f"Maintained {len(results)} tables.")
+
+            status = self.db_manager.maintenance_status()
+            if not status:
+                st.error("Failed to collect maintenance statistics.")
+            else:
+                st.subheader("Dead tuples and last vacuum / analyze")
+                st.dataframe(pd.DataFrame(status["tables"]))
+                st.subheader("Rows changed since last maintenance")
+                st.write(
+                    f"ANALYZE after {status['analyze_threshold']} rows, "
+                    f"VACUUM after {status['vacuum_threshold']} rows, "
+                    f"REINDEX below {status['reindex_min_density']}% leaf density."
+                )
+                st.dataframe(
+                    pd.DataFrame(
+                        [
+                            {
+                                "table": table_name,
+                                "rows": rows or 0,
+                                "cleared": rows is None,
+                            }
+                            for table_name, rows in status["pending"].items()
+                        ]
+                    )
+                )
+                st.subheader("Last maintenance")
+                st.dataframe(pd.DataFrame(status["history"]))
 
         elif operation == "Delete Specific Record":
             table_name = st.text_input("Enter table name to delete record from")
-            record_id = st.text_input("Enter record ID to delete")
+            self.__name_lookup(table_name, "delete_lookup")
+            record_id = st.text_input(
+                "Enter record ID to delete (several IDs separated by commas)"
+            )
             if st.button("Delete Record"):
-                self.db_manager.delete_specific_record(table_name, record_id)
-                st.success(
-                    f"Record '{record_id}' from '{table_name}' deleted successfully!"
-                )
+                try:
+                    ids = [int(key) for key in record_id.split(",") if key.strip()]
+                except ValueError:
+                    st.error(f"Invalid record ID '{record_id}'.")
+                    ids = []
+                if ids:
+                    deleted = self.db_manager.delete_records(table_name, ids)
+                    if deleted is False or deleted is None:
+                        st.error(f"Failed to delete records from '{table_name}'.")
+                    else:
+                        st.success(
+                            f"{deleted} records from '{table_name}' deleted successfully!"
+                        )
+
+    def __show_table_browser(self):
+        """Paginated table view: every page is read from the last seen key."""
+        table_name = st.selectbox(
+            "Choose table to browse", ["users", "products", "orders", "orderitems"]
+        )
+        order_by = st.text_input("Sort by column (primary key by default)")
+        descending = st.checkbox("Descending")
+        filters_text = st.text_input(
+            "Filters as JSON. For example: {'status': 'Pending'}"
+        )
+        try:
+            filters = ast.literal_eval(filters_text) if filters_text else None
+        except (ValueError, SyntaxError) as e:
+            st.error(f"Invalid filters: {e}")
+            return
+
+        # При смене таблицы, сортировки или фильтров начинаем с первой страницы
+        browse_state = (table_name, order_by, descending, filters_text)
+        if st.session_state.get("browse_state") != browse_state:
+            st.session_state.browse_state = browse_state
+            st.session_state.browse_keys = [None]
+
+        page_keys = st.session_state.browse_keys
+        rows, next_key = self.db_manager.browse_table(
+            table_name,
+            order_by=order_by or None,
+            filters=filters,
+            after_key=page_keys[-1],
+            descending=descending,
+            result_format="arrow",
+        )
+        if rows:
+            st.dataframe(rows)
+        else:
+            st.write("No results found.")
+
+        previous_column, page_column, next_column = st.columns(3)
+        page_column.write(f"Page {len(page_keys)}")
+        if previous_column.button("Previous", disabled=len(page_keys) == 1):
+            page_keys.pop()
+            st.rerun()
+        if next_column.button("Next", disabled=next_key is None):
+            page_keys.append(next_key)
+            st.rerun()
+
+    def __name_lookup(self, table_name, key):
+        """Suggest ids of users or products by the beginning of their name."""
+        if table_name.lower() not in ["users", "products"]:
+            return
+        prefix = st.text_input("Find ID by name (start typing)", key=key)
+        suggestions = self.db_manager.suggest_names(table_name, prefix)
+        if suggestions is None:
+            st.error("Failed to load name suggestions, see the log.")
+            return
+        for row_id, name in suggestions:
+            st.caption(f"{row_id} - {name}")
+
+    @staticmethod
+    def __format_size(size):
+        """Human readable size in bytes."""
+        for unit in ["B", "KB", "MB", "GB"]:
+            if size < 1024:
+                return f"{size:.0f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TB"
+
+    @logs
+    def __spool_export(self, table_name, file_format):
+        """Write exported chunks to a file served from disk, return its URL."""
+        chunks = self.db_manager.export_table(table_name, file_format)
+        if not chunks:
+            return None
+
+        self.__remove_old_exports()
+        token = uuid.uuid4().hex
+        file_name = f"{table_name}.{file_format}"
+        export_dir = os.path.join(EXPORT_DIR, token)
+        os.makedirs(export_dir)
+        try:
+            with open(os.path.join(export_dir, file_name), "wb") as export_file:
+                for chunk in chunks:
+                    export_file.write(chunk)
+        except Exception as e:
+            logging.error(f"Error exporting table '{table_name}': {e}")
+            shutil.rmtree(export_dir, ignore_errors=True)
+            return None
+        return f"app/static/exports/{token}/{file_name}"
+
+    @staticmethod
+    def __remove_old_exports():
+        """Remove exports older than EXPORT_TTL seconds."""
+        if not os.path.isdir(EXPORT_DIR):
+            return
+        expired = time.time() - EXPORT_TTL
+        for entry in os.scandir(EXPORT_DIR):
+            if entry.is_dir() and entry.stat().st_mtime < expired:
+                shutil.rmtree(entry.path, ignore_errors=True)
 
     @logs
     def __show_results(self, result):
@@ -260,23 +658,12 @@ class StreamlitDatabaseApp:
             return True
 
         all_passed = True
-        tables_data = {}
-        for table_name, table_content in result:
-            if table_name not in tables_data:
-                tables_data[table_name] = []
-            tables_data[table_name].append(table_content)
-
-        for table_name, table_content in tables_data.items():
+        for table_name, df in columnar.json_rows_to_frames(result).items():
             st.subheader(f"{table_name.capitalize()}")
-            dfs = []
-            for data_content in table_content:
-                df = pd.DataFrame([data_content])
-                dfs += [df]
-                logging.info("Results displayed successfully.")
-                if df.empty:
-                    all_passed = False
-            final_df = pd.concat(dfs)
-            st.write(final_df)
+            st.write(df)
+            logging.info("Results displayed successfully.")
+            if df.empty:
+                all_passed = False
         return all_passed
 
     def run(self):
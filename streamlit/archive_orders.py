@@ -0,0 +1,83 @@
+"""Перенос старых заказов в архив (схема delivery_archive) пачками.
+
+Каждая пачка - отдельная транзакция, поэтому перенос можно прервать
+и продолжить повторным запуском с теми же параметрами.
+
+    python archive_orders.py --older-than 2025-01-01 --batch-size 1000
+"""
+
+import argparse
+import os
+
+from db_procedures import ARCHIVE_STATUS, BATCH_SIZE, DatabaseManager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def print_progress(report):
+    print(
+        f"batch {report['batches']}: {report['orders']} orders, "
+        f"{report['items']} items, {report['seconds']:.1f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--older-than", required=True, help="archive orders placed before this date"
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--status",
+        default=ARCHIVE_STATUS,
+        help="status of orders to archive, 'any' to archive orders in any status",
+    )
+    parser.add_argument(
+        "--skip-maintenance",
+        action="store_true",
+        help="do not vacuum Orders and OrderItems after archiving",
+    )
+    parser.add_argument("--user", default=os.getenv("ADMIN_USERNAME"))
+    parser.add_argument("--password", default=os.getenv("ADMIN_PASSWORD"))
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(
+        db_name=os.getenv("DB_NAME"),
+        db_user=args.user,
+        db_password=args.password,
+        db_host=os.getenv("DB_HOST", "localhost"),
+        db_port=os.getenv("DB_PORT", "5432"),
+        pool_size=1,
+        max_overflow=0,
+        auto_maintenance=not args.skip_maintenance,
+    )
+    try:
+        report = db_manager.archive_orders(
+            args.older_than,
+            args.batch_size,
+            None if args.status == "any" else args.status,
+            progress_callback=print_progress,
+        )
+        if report and report["orders"] and not args.skip_maintenance:
+            for result in db_manager.run_maintenance(["orders", "orderitems"]):
+                print(
+                    f"{result['action']} {result['table']}: {result['seconds']:.1f} s"
+                    + (f", failed: {result['error']}" if result["error"] else "")
+                )
+    finally:
+        db_manager.close(dispose=True)
+
+    if report is None:
+        raise SystemExit("Archiving failed, see the log for details")
+    if "orders_per_second" in report:
+        print(
+            f"Archived {report['orders']} orders and {report['items']} items "
+            f"in {report['seconds']:.1f} s ({report['orders_per_second']:.0f} orders/s)"
+        )
+    if "error" in report:
+        raise SystemExit(f"Archiving failed: {report['error']}")
+
+
+if __name__ == "__main__":
+    main()
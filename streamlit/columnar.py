@@ -0,0 +1,151 @@
+"""Колоночное представление результатов запросов (pandas/Arrow/Parquet)"""
+
+import io
+
+# OID типов PostgreSQL -> типы Arrow (все остальные типы выгружаются строками)
+PG_ARROW_TYPES = {
+    16: "bool_",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1082: "date32",
+}
+PG_TIMESTAMP_OID = 1114
+
+
+def json_rows_to_frames(result):
+    """Группировка строк (имя таблицы, JSON строки) по таблицам в один DataFrame на таблицу"""
+    import pandas as pd
+
+    records = {}
+    for table_name, row_content in result:
+        records.setdefault(table_name, []).append(row_content)
+    return {
+        table_name: pd.DataFrame.from_records(table_records)
+        for table_name, table_records in records.items()
+    }
+
+
+def arrow_schema(description):
+    """Схема Arrow по cursor.description запроса"""
+    import pyarrow as pa
+
+    fields = []
+    for column in description:
+        if column.type_code == PG_TIMESTAMP_OID:
+            arrow_type = pa.timestamp("us")
+        elif column.type_code in PG_ARROW_TYPES:
+            arrow_type = getattr(pa, PG_ARROW_TYPES[column.type_code])()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def csv_batches(csv_chunks, schema):
+    """Потоковое чтение CSV (с заголовком, как его выдает COPY) в record batch'и Arrow"""
+    import pyarrow.csv as pa_csv
+
+    return pa_csv.open_csv(
+        io.BufferedReader(_IterableReader(csv_chunks)),
+        convert_options=_convert_options(schema),
+    )
+
+
+def read_csv_table(csv_file, schema):
+    """Чтение CSV (с заголовком, как его выдает COPY) целиком в таблицу Arrow"""
+    import pyarrow.csv as pa_csv
+
+    return pa_csv.read_csv(csv_file, convert_options=_convert_options(schema))
+
+
+def convert_table(table, result_format):
+    """Таблица Arrow как есть или словарь массивов NumPy по колонкам"""
+    if result_format == "numpy":
+        return {
+            name: column.to_numpy()
+            for name, column in zip(table.column_names, table.columns)
+        }
+    return table
+
+
+def parquet_chunks(csv_chunks, schema):
+    """Перекодирование потока CSV в Parquet: по одной группе строк на record batch"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for batch in csv_batches(csv_chunks, schema):
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def _convert_options(schema):
+    """Типы колонок из схемы; пустое значение без кавычек - NULL, "" - пустая строка.
+    COPY ... CSV записывает boolean как t/f
+    """
+    import pyarrow.csv as pa_csv
+
+    return pa_csv.ConvertOptions(
+        column_types=schema,
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False,
+        true_values=["t"],
+        false_values=["f"],
+    )
+
+
+class _IterableReader(io.RawIOBase):
+    """Файловый объект только для чтения поверх итератора байтовых пачек"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            self._pending = next(self._chunks, b"")
+            if not self._pending:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class _StreamSink(io.RawIOBase):
+    """Файловый объект только для записи, который отдает записанное пачками"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
@@ -1,15 +1,283 @@
+import csv
+import io
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import columnar
+import index_advisor
+import maintenance
 from logger import logging, logs
 from sqlalchemy import MetaData, create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 
+# Колонки, которые заполняются при добавлении данных, и их типы в SQL
+TABLE_COLUMNS = {
+    "users": (
+        ("name", "varchar"),
+        ("email", "varchar"),
+        ("phone", "varchar"),
+        ("address", "varchar"),
+    ),
+    "products": (
+        ("name", "varchar"),
+        ("description", "text"),
+        ("price", "int"),
+        ("stock", "int"),
+    ),
+    "orders": (("user_id", "int"), ("status", "varchar")),
+    "orderitems": (("order_id", "int"), ("product_id", "int"), ("quantity", "int")),
+}
+
+# Первичные ключи таблиц
+TABLE_KEYS = {
+    "users": "user_id",
+    "products": "product_id",
+    "orders": "order_id",
+    "orderitems": "order_item_id",
+}
+
+# Порядок загрузки таблиц с учетом внешних ключей
+INGEST_ORDER = ("users", "products", "orders", "orderitems")
+
+# Таблицы, строки которых меняют триггеры при записи в таблицу
+TRIGGER_TABLES = {"orderitems": ("orders", "products")}
+
+# Таблицы, строки которых меняются при удалении из таблицы (каскадное удаление и триггеры)
+CASCADE_TABLES = {
+    "users": ("orders", "orderitems", "products"),
+    "products": ("orderitems", "orders"),
+    "orders": ("orderitems", "products"),
+    "orderitems": ("orders", "products"),
+}
+
+# Размер пачки по умолчанию для пакетных операций
+BATCH_SIZE = 1000
+
+# Число строк, которое показывается при раскрытии таблицы
+TABLE_PREVIEW_ROWS = 1000
+
+# Форматы результата методов чтения: строки SQLAlchemy, таблица Arrow или
+# словарь массивов NumPy по колонкам
+RESULT_FORMATS = ("rows", "arrow", "numpy")
+
+# Режимы и размер страницы поиска товаров по описанию
+SEARCH_MODES = ("substring", "prefix", "fulltext")
+SEARCH_LIMIT = 50
+
+# Подсказки по началу имени: число подсказок, размер и время жизни кеша префиксов
+SUGGEST_LIMIT = 10
+SUGGEST_CACHE_SIZE = 256
+SUGGEST_CACHE_TTL = 30
+
+# Размер страницы при постраничном просмотре таблиц
+PAGE_SIZE = 50
+
+# Число заказов, которое диспетчер доставки захватывает за один вызов
+CLAIM_LIMIT = 10
+
+# Статус заказов, которые по умолчанию переносятся в архив
+ARCHIVE_STATUS = "Completed"
+
+# Размер пачки (в строках) при потоковой загрузке файлов через COPY
+INGEST_CHUNK_ROWS = 50000
+
+# Размер пачки (в байтах) и длина очереди при потоковой выгрузке через COPY
+EXPORT_CHUNK_BYTES = 1024 * 1024
+EXPORT_QUEUE_SIZE = 4
+
+# Настройки пула соединений по умолчанию
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+POOL_PRE_PING = True
+POOL_RECYCLE = 1800
+
+
+class PreparedStatement:
+    """Оператор записи, который готовится на сервере один раз на соединение"""
+
+    def __init__(self, name, params, sql):
+        self.name = name
+        self.params = params
+        self.prepare = text(f"PREPARE {name} AS {sql}")
+        placeholders = ", ".join(f":{param}" for param in params)
+        self.execute = text(f"EXECUTE {name}({placeholders})")
+
+
+# Реестр операторов записи: (таблица, операция) -> подготовленный оператор.
+# Типы параметров заданы явно, поэтому перегрузка add_info/update_cortege
+# разрешается один раз при PREPARE, а не при каждом вызове.
+STATEMENTS = {
+    ("users", "add"): PreparedStatement(
+        "add_users",
+        ("name", "email", "phone", "address"),
+        "SELECT delivery_schema.add_info($1::varchar, $2::varchar, $3::varchar, $4::varchar)",
+    ),
+    ("products", "add"): PreparedStatement(
+        "add_products",
+        ("name", "description", "price", "stock"),
+        "SELECT delivery_schema.add_info($1::varchar, $2::text, $3::int, $4::int)",
+    ),
+    ("orders", "add"): PreparedStatement(
+        "add_orders",
+        ("user_id", "status"),
+        "SELECT delivery_schema.add_info($1::int, $2::varchar)",
+    ),
+    ("orderitems", "add"): PreparedStatement(
+        "add_orderitems",
+        ("order_id", "product_id", "quantity"),
+        "SELECT delivery_schema.add_info($1::int, $2::int, $3::int)",
+    ),
+    ("users", "update"): PreparedStatement(
+        "update_users",
+        ("key", "name", "email", "phone", "address"),
+        "SELECT delivery_schema.update_cortege($1::int, $2::varchar, $3::varchar, $4::varchar, $5::varchar)",
+    ),
+    ("products", "update"): PreparedStatement(
+        "update_products",
+        ("key", "name", "description", "stock"),
+        "SELECT delivery_schema.update_cortege($1::int, $2::text, $3::text, $4::int)",
+    ),
+    ("orders", "update"): PreparedStatement(
+        "update_orders",
+        ("key", "user_id", "status"),
+        "SELECT delivery_schema.update_cortege($1::int, $2::int, $3::varchar)",
+    ),
+    ("orderitems", "update"): PreparedStatement(
+        "update_orderitems",
+        ("key", "order_id", "product_id", "quantity"),
+        "SELECT delivery_schema.update_cortege($1::int, $2::int, $3::int, $4::int)",
+    ),
+}
+
+# Счетчики выполнений и подготовок операторов из реестра
+_statement_stats = {
+    statement.name: {"executions": 0, "prepares": 0}
+    for statement in STATEMENTS.values()
+}
+_statement_stats_lock = threading.Lock()
+
+
+class LRUCache:
+    """Небольшой потокобезопасный LRU-кеш с ограниченным временем жизни записей"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# Кеш недавних префиксов для подсказок, общий для всех сессий процесса
+_suggest_cache = LRUCache(SUGGEST_CACHE_SIZE, SUGGEST_CACHE_TTL)
+
+# Общие для всего процесса движки (пулы соединений) по строке подключения и настройкам пула
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def acquire_engine(
+    db_url,
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    pool_pre_ping=POOL_PRE_PING,
+    pool_recycle=POOL_RECYCLE,
+):
+    """Общий движок для строки подключения: создается один раз на процесс"""
+    key = (db_url, pool_size, max_overflow, pool_pre_ping, pool_recycle)
+    with _engines_lock:
+        entry = _engines.get(key)
+        if entry is None:
+            engine = create_engine(
+                db_url,
+                isolation_level="AUTOCOMMIT",
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_pre_ping=pool_pre_ping,
+                pool_recycle=pool_recycle,
+            )
+            entry = _engines[key] = {"engine": engine, "handles": 0}
+        entry["handles"] += 1
+        return entry["engine"]
+
+
+def release_engine(engine, dispose=False):
+    """Освобождение ссылки на общий движок.
+
+    Пул закрывается только при dispose=True и только если движком больше
+    никто не пользуется.
+    """
+    with _engines_lock:
+        for key, entry in list(_engines.items()):
+            if entry["engine"] is not engine:
+                continue
+            entry["handles"] = max(entry["handles"] - 1, 0)
+            if dispose and not entry["handles"]:
+                del _engines[key]
+                engine.dispose()
+            return
+
 
 class DatabaseManager:
     def __init__(
-        self, db_name, db_user, db_password, db_host="localhost", db_port="5432"
+        self,
+        db_name,
+        db_user,
+        db_password,
+        db_host="localhost",
+        db_port="5432",
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_pre_ping=POOL_PRE_PING,
+        pool_recycle=POOL_RECYCLE,
+        auto_maintenance=False,
+        maintenance_engine=None,
+        maintenance_settings=None,
     ):
+        """auto_maintenance=True - запустить фоновый планировщик обслуживания
+        таблиц после массовых операций (без него run_maintenance недоступен),
+        maintenance_engine - движок владельца таблиц, с учетными данными которого
+        планировщик открывает свое соединение для VACUUM, ANALYZE и REINDEX
+        (по умолчанию движок пользователя), maintenance_settings - пороги
+        maintenance.MaintenanceScheduler
+        """
         db_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-        self.engine = create_engine(db_url, isolation_level="AUTOCOMMIT")
+        self.engine = acquire_engine(
+            db_url, pool_size, max_overflow, pool_pre_ping, pool_recycle
+        )
+        self.maintenance = None
+        if auto_maintenance:
+            self.maintenance = maintenance.get_scheduler(
+                maintenance_engine or self.engine, **(maintenance_settings or {})
+            )
         self.metadata = MetaData()
         self.Session = sessionmaker(bind=self.engine)
         self.session = self.Session()
@@ -38,43 +306,198 @@ class DatabaseManager:
             return False
 
     @logs
-    def show_tables_content(self):
-        """Вывод содержимого таблиц"""
-        query = text("SELECT * FROM delivery_schema.show_tables_content();")
+    def show_tables_content(self, summary=False, result_format="rows"):
+        """Вывод содержимого таблиц.
+
+        В режиме summary возвращаются только имена таблиц, оценка числа строк
+        и размер на диске, сами таблицы при этом не читаются. В колоночных
+        форматах (arrow, numpy) возвращается словарь {таблица: данные}.
+        """
+        if result_format not in RESULT_FORMATS:
+            logging.error(
+                f"Error showing tables content: unknown format '{result_format}'"
+            )
+            return []
+
+        if summary:
+            query = text("SELECT * FROM delivery_schema.show_tables_summary();")
+        else:
+            query = text("SELECT * FROM delivery_schema.show_tables_content();")
         try:
             with self.engine.connect() as conn:
-                result = self.__safe_execute(conn, query, None)
-                return result.fetchall()
+                if summary or result_format == "rows":
+                    return self.__fetch(conn, query, {}, result_format)
+                return {
+                    table_name: self.__fetch(
+                        conn,
+                        text(f"SELECT * FROM delivery_tables_schema.{table_name}"),
+                        {},
+                        result_format,
+                    )
+                    for table_name in TABLE_KEYS
+                }
         except SQLAlchemyError as e:
             logging.error(f"Error showing tables content: {e}")
             return []
 
     @logs
-    def clear_table(self, table_name):
-        """Очистка одной таблицы"""
+    def show_table_content(
+        self, table_name, limit=TABLE_PREVIEW_ROWS, result_format="rows"
+    ):
+        """Вывод первых limit строк одной таблицы с типизированными колонками"""
+        if not table_name or table_name.lower() not in TABLE_KEYS:
+            logging.error(
+                f"Error showing table content: table '{table_name}' not found"
+            )
+            return []
+
+        if result_format not in RESULT_FORMATS:
+            logging.error(
+                f"Error showing table content: unknown format '{result_format}'"
+            )
+            return []
+
+        query = text(
+            f"SELECT * FROM delivery_tables_schema.{table_name.lower()} "
+            f"ORDER BY {TABLE_KEYS[table_name.lower()]} LIMIT :limit;"
+        )
+        try:
+            with self.engine.connect() as conn:
+                return self.__fetch(conn, query, {"limit": int(limit)}, result_format)
+        except (SQLAlchemyError, TypeError, ValueError) as e:
+            logging.error(f"Error showing content of table {table_name}: {e}")
+            return []
+
+    @logs
+    def browse_table(
+        self,
+        table_name,
+        order_by=None,
+        filters=None,
+        after_key=None,
+        limit=PAGE_SIZE,
+        descending=False,
+        result_format="rows",
+    ):
+        """Постраничный просмотр таблицы по ключу (keyset pagination).
+
+        Страница читается по индексу с позиции after_key, поэтому ее стоимость
+        не зависит от номера страницы. Если сортировка идет не по первичному
+        ключу, after_key - пара (значение колонки сортировки, первичный ключ).
+        Возвращает (строки, ключ следующей страницы или None).
+        """
+        if not table_name or table_name.lower() not in TABLE_KEYS:
+            logging.error(f"Error browsing table: table '{table_name}' not found")
+            return [], None
+
+        if not isinstance(limit, int) or limit < 1:
+            logging.error(f"Error browsing table: invalid limit '{limit}'")
+            return [], None
+
+        if result_format not in RESULT_FORMATS:
+            logging.error(f"Error browsing table: unknown format '{result_format}'")
+            return [], None
+
+        preparer = self.engine.dialect.identifier_preparer
+        key = TABLE_KEYS[table_name.lower()]
+        sort_columns = [key] if not order_by or order_by == key else [order_by, key]
+        sort_sql = ", ".join(preparer.quote(column) for column in sort_columns)
+        direction = "DESC" if descending else "ASC"
+
+        conditions, params = self.__build_filters(filters)
+        conditions = [conditions] if conditions else []
+        if after_key is not None:
+            after_values = (
+                list(after_key) if isinstance(after_key, (list, tuple)) else [after_key]
+            )
+            if len(after_values) != len(sort_columns):
+                logging.error(f"Error browsing table: invalid key '{after_key}'")
+                return [], None
+            placeholders = ", ".join(
+                f":after_{position}" for position in range(len(after_values))
+            )
+            conditions.append(
+                f"({sort_sql}) {'<' if descending else '>'} ({placeholders})"
+            )
+            params.update(
+                {
+                    f"after_{position}": value
+                    for position, value in enumerate(after_values)
+                }
+            )
+
+        order_sql = ", ".join(
+            f"{preparer.quote(column)} {direction}" for column in sort_columns
+        )
+        query = text(
+            f"SELECT * FROM delivery_tables_schema.{table_name.lower()}"
+            + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+            + f" ORDER BY {order_sql} LIMIT :limit;"
+        )
+        # Читаем на одну строку больше, чтобы понять, есть ли следующая страница
+        params["limit"] = limit + 1
+
+        try:
+            with self.engine.connect() as conn:
+                logging.debug(
+                    f"Browsing table '{table_name.lower()}' after '{after_key}'"
+                )
+                # Ключ следующей страницы берется из Arrow до конвертации в NumPy
+                rows = self.__fetch(
+                    conn, query, params, "rows" if result_format == "rows" else "arrow"
+                )
+        except SQLAlchemyError as e:
+            logging.error(f"Error browsing table {table_name}: {e}")
+            return [], None
+
+        if result_format == "rows":
+            if len(rows) <= limit:
+                return rows, None
+            rows = rows[:limit]
+            next_key = tuple(rows[-1]._mapping[column] for column in sort_columns)
+        else:
+            if rows.num_rows <= limit:
+                return columnar.convert_table(rows, result_format), None
+            rows = rows.slice(0, limit)
+            next_key = tuple(
+                rows.column(column)[limit - 1].as_py() for column in sort_columns
+            )
+            rows = columnar.convert_table(rows, result_format)
+        return rows, next_key if len(next_key) > 1 else next_key[0]
+
+    @logs
+    def clear_table(self, table_name, fast=False):
+        """Очистка одной таблицы.
+
+        fast=True - TRUNCATE вместо построчного DELETE с триггерами,
+        ссылающиеся таблицы очищаются целиком
+        """
         if table_name not in ["products", "users", "orderitems", "orders"]:
             logging.error(f"Error clearing table: table '{table_name}' not found")
             return False
 
-        query = text("CALL delivery_schema.clear_sertain_table(:table_name);")
-        params = {"table_name": table_name.lower()}
+        query = text("CALL delivery_schema.clear_sertain_table(:table_name, :fast);")
+        params = {"table_name": table_name.lower(), "fast": fast}
         try:
             with self.engine.connect() as conn:
                 logging.debug(f"Clearing table '{table_name.lower()}'")
                 self.__safe_execute(conn, query, params)
+            self.__track(table_name.lower(), None, cascade=True)
             return True
         except SQLAlchemyError as e:
             logging.error(f"Error clearing table {table_name}: {e}")
             return False
 
     @logs
-    def clear_all_tables(self):
-        """Очистка всех таблиц"""
-        query = text("CALL delivery_schema.clear_all_tables();")
+    def clear_all_tables(self, fast=False):
+        """Очистка всех таблиц. fast=True - один TRUNCATE без построчных триггеров"""
+        query = text("CALL delivery_schema.clear_all_tables(:fast);")
         try:
             with self.engine.connect() as conn:
                 logging.debug("Clearing all tables")
-                self.__safe_execute(conn, query, None)
+                self.__safe_execute(conn, query, {"fast": fast})
+            for table_name in TABLE_KEYS:
+                self.__track(table_name, None)
             return True
         except SQLAlchemyError as e:
             logging.error(f"Error clearing all tables: {e}")
@@ -86,86 +509,494 @@ class DatabaseManager:
         if not table_name or not data:
             return False
 
-        if table_name not in ["products", "users", "orderitems", "orders"]:
-            logging.error(f"Error clearing table: table '{table_name}' not found")
+        if table_name.lower() not in TABLE_COLUMNS:
+            logging.error(f"Error adding data: table '{table_name}' not found")
             return False
 
-        params = {}
-        query = ""
-        logging.debug(f"Adding data to table '{table_name.lower()}'")
-        if table_name.lower() == "products":
-            params = {
-                "name": data["name"],
-                "description": data["description"],
-                "price": data["price"],
-                "stock": data["stock"],
-            }
-            query = text(
-                "SELECT delivery_schema.add_info(:name, :description, :price, :stock);"
+        try:
+            with self.engine.connect() as conn:
+                logging.debug(f"Adding data to table '{table_name.lower()}'")
+                result = self.__execute_statement(conn, table_name.lower(), "add", data)
+            if result:
+                self.__track(table_name.lower(), 1)
+            return result
+        except (SQLAlchemyError, KeyError) as e:
+            logging.error(f"Error adding data: {e}")
+            return False
+
+    @logs
+    def add_rows(self, table_name, rows, chunk_size=BATCH_SIZE):
+        """Пакетное добавление данных: одна пачка = один запрос и одна транзакция"""
+        report = {"batches": [], "inserted": 0, "rejected": []}
+        if not table_name or not rows:
+            return report
+
+        if table_name.lower() not in TABLE_COLUMNS:
+            logging.error(f"Error adding rows: table '{table_name}' not found")
+            return report
+
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            logging.error(f"Error adding rows: invalid chunk size '{chunk_size}'")
+            return report
+
+        columns = TABLE_COLUMNS[table_name.lower()]
+        arguments = ", ".join(
+            f"CAST(:{name} AS {sql_type}[])" for name, sql_type in columns
+        )
+        query = text(f"SELECT delivery_schema.add_info_batch({arguments});")
+
+        try:
+            with self.engine.connect() as conn:
+                logging.debug(
+                    f"Adding rows to table '{table_name.lower()}' in chunks of {chunk_size}"
+                )
+                chunk = []
+                for index, row in enumerate(rows):
+                    try:
+                        chunk.append((index, self.__prepare_batch_row(columns, row)))
+                    except (KeyError, TypeError, ValueError) as e:
+                        report["rejected"].append({"row": index, "error": str(e)})
+                        continue
+
+                    if len(chunk) == chunk_size:
+                        report["batches"].append(
+                            self.__execute_batch(conn, query, columns, chunk, report)
+                        )
+                        chunk = []
+
+                if chunk:
+                    report["batches"].append(
+                        self.__execute_batch(conn, query, columns, chunk, report)
+                    )
+        except SQLAlchemyError as e:
+            logging.error(f"Error adding rows: {e}")
+
+        report["inserted"] = sum(report["batches"])
+        self.__track(table_name.lower(), report["inserted"])
+        return report
+
+    @logs
+    def ingest_file(
+        self,
+        table_name,
+        source,
+        file_format=None,
+        chunk_size=INGEST_CHUNK_ROWS,
+        progress_callback=None,
+    ):
+        """Потоковая загрузка CSV/Parquet файла через COPY во временную таблицу.
+
+        Каждая пачка загружается и переносится в основную таблицу в своей
+        транзакции, поэтому в памяти одновременно находится не больше одной пачки.
+        progress_callback(rows, fraction) вызывается после каждой пачки.
+        """
+        report = {"table": table_name, "rows": 0, "chunks": 0, "merged": 0}
+        if not table_name or source is None:
+            report["error"] = "table name and source are required"
+            return report
+
+        if table_name.lower() not in TABLE_COLUMNS:
+            logging.error(f"Error ingesting file: table '{table_name}' not found")
+            report["error"] = f"table '{table_name}' not found"
+            return report
+
+        table_name = table_name.lower()
+        file_format = (file_format or self.__detect_file_format(source)).lower()
+        if file_format == "csv":
+            chunks = self.__csv_chunks(source, chunk_size)
+        elif file_format == "parquet":
+            chunks = self.__parquet_chunks(source, chunk_size)
+        else:
+            logging.error(f"Error ingesting file: unsupported format '{file_format}'")
+            report["error"] = f"unsupported format '{file_format}'"
+            return report
+
+        allowed = {TABLE_KEYS[table_name]} | {
+            name for name, _ in TABLE_COLUMNS[table_name]
+        }
+        merge_query = text("SELECT delivery_schema.merge_staging_table(:table_name);")
+        try:
+            with self.engine.connect() as conn:
+                # COPY и перенос пачки должны идти в одной транзакции
+                conn.execution_options(isolation_level="READ COMMITTED")
+                with conn.begin():
+                    conn.execute(
+                        text(
+                            "CALL delivery_schema.prepare_staging_table(:table_name);"
+                        ),
+                        {"table_name": table_name},
+                    )
+
+                for columns, buffer, rows, fraction in chunks:
+                    unknown = set(columns) - allowed
+                    if unknown:
+                        raise ValueError(f"Unknown columns: {sorted(unknown)}")
+
+                    copy_sql = (
+                        f"COPY pg_temp.staging_{table_name} ({', '.join(columns)}) "
+                        "FROM STDIN WITH (FORMAT csv, HEADER true)"
+                    )
+                    with conn.begin():
+                        conn.connection.cursor().copy_expert(copy_sql, buffer)
+                        report["merged"] += (
+                            conn.execute(
+                                merge_query, {"table_name": table_name}
+                            ).scalar()
+                            or 0
+                        )
+                    report["rows"] += rows
+                    report["chunks"] += 1
+                    logging.debug(
+                        f"Ingested chunk {report['chunks']} into '{table_name}' ({report['rows']} rows)"
+                    )
+                    if progress_callback:
+                        progress_callback(report["rows"], fraction)
+        except (SQLAlchemyError, ValueError, OSError, csv.Error) as e:
+            logging.error(f"Error ingesting file into '{table_name}': {e}")
+            report["error"] = str(e)
+        finally:
+            chunks.close()
+
+        self.__track(table_name, report["merged"])
+        return report
+
+    @logs
+    def ingest_files(
+        self, sources, chunk_size=INGEST_CHUNK_ROWS, progress_callback=None
+    ):
+        """Загрузка нескольких файлов {таблица: файл} в порядке внешних ключей"""
+        reports = []
+        for table_name in INGEST_ORDER:
+            for name, source in sources.items():
+                if name.lower() != table_name:
+                    continue
+                report = self.ingest_file(
+                    table_name,
+                    source,
+                    chunk_size=chunk_size,
+                    progress_callback=progress_callback,
+                )
+                reports.append(report)
+                if not report or "error" in report:
+                    return reports
+        return reports
+
+    @logs
+    def export_table(
+        self, table_name, file_format="csv", chunk_size=EXPORT_CHUNK_BYTES
+    ):
+        """Потоковая выгрузка таблицы через COPY ... TO STDOUT.
+
+        Возвращает генератор байтовых пачек в формате csv, binary (формат COPY
+        PostgreSQL) или parquet. В памяти одновременно находится не больше
+        EXPORT_QUEUE_SIZE пачек.
+        """
+        if not table_name or table_name.lower() not in TABLE_KEYS:
+            logging.error(f"Error exporting table: table '{table_name}' not found")
+            return False
+
+        select = f"SELECT * FROM delivery_tables_schema.{table_name.lower()}"
+        if file_format == "csv":
+            return self.__copy_out(
+                f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", chunk_size
             )
-        elif table_name.lower() == "users":
-            params = {
-                "name": data["name"],
-                "email": data["email"],
-                "phone": data["phone"],
-                "address": data["address"],
-            }
-            query = text(
-                "SELECT delivery_schema.add_info(CAST(:name AS varchar), CAST(:email AS varchar), CAST(:phone AS varchar), CAST(:address AS varchar));"
+        if file_format == "binary":
+            return self.__copy_out(
+                f"COPY ({select}) TO STDOUT WITH (FORMAT binary)", chunk_size
             )
-        elif table_name.lower() == "orderitems":
-            params = {
-                "order_id": data["order_id"],
-                "product_id": data["product_id"],
-                "quantity": data["quantity"],
-            }
-            query = text(
-                "SELECT delivery_schema.add_info(:order_id, :product_id, :quantity);"
+        if file_format == "parquet":
+            try:
+                with self.engine.connect() as conn:
+                    cursor = conn.connection.cursor()
+                    cursor.execute(f"{select} LIMIT 0")
+                    schema = columnar.arrow_schema(cursor.description)
+            except SQLAlchemyError as e:
+                logging.error(f"Error exporting table {table_name}: {e}")
+                return False
+            csv_chunks = self.__copy_out(
+                f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", chunk_size
+            )
+            return columnar.parquet_chunks(csv_chunks, schema)
+
+        logging.error(f"Error exporting table: unsupported format '{file_format}'")
+        return False
+
+    @logs
+    def iter_rows(self, table_name, columns=None, where=None, batch_size=BATCH_SIZE):
+        """Чтение таблицы через серверный курсор пачками по batch_size строк.
+
+        where - словарь {колонка: значение}; список значений означает "= ANY".
+        Возвращает генератор строк.
+        """
+        if not table_name or table_name.lower() not in TABLE_KEYS:
+            logging.error(f"Error reading rows: table '{table_name}' not found")
+            return []
+
+        if not isinstance(batch_size, int) or batch_size < 1:
+            logging.error(f"Error reading rows: invalid batch size '{batch_size}'")
+            return []
+
+        preparer = self.engine.dialect.identifier_preparer
+        selected = ", ".join(preparer.quote(c) for c in columns) if columns else "*"
+        conditions, params = self.__build_filters(where)
+        query = text(
+            f"SELECT {selected} FROM delivery_tables_schema.{table_name.lower()}"
+            + (f" WHERE {conditions}" if conditions else "")
+        )
+        return self.__stream_rows(query, params, batch_size)
+
+    @logs
+    def search_by_text_field(
+        self,
+        request_msg_desc,
+        mode="substring",
+        limit=SEARCH_LIMIT,
+        after=None,
+        result_format="rows",
+    ):
+        """Поиск по заранее выбранному (вами) текстовому не ключевому полю.
+
+        mode: substring, prefix или fulltext. Результаты упорядочены по
+        релевантности (колонка rank); для следующей страницы передается
+        after = (rank, product_id) последней строки.
+        """
+        if result_format not in RESULT_FORMATS:
+            logging.error(
+                f"Error searching by text field: unknown format '{result_format}'"
             )
-        elif table_name.lower() == "orders":
-            params = {
-                "user_id": data["user_id"],
-                "status": data["status"],
-            }
-            query = text("SELECT delivery_schema.add_info(:user_id, :status);")
-        else:
-            logging.error(f"Error adding data: table '{table_name.lower()}' not found")
             return False
 
+        if mode not in SEARCH_MODES:
+            logging.error(f"Error searching by text field: unknown mode '{mode}'")
+            return False
+
+        after_rank, after_id = after if after else (None, None)
+        query = text(
+            "SELECT * FROM delivery_schema.search_products("
+            ":description, :mode, :limit, CAST(:after_rank AS real), CAST(:after_id AS int));"
+        )
+        params = {
+            "description": request_msg_desc,
+            "mode": mode,
+            "limit": limit,
+            "after_rank": after_rank,
+            "after_id": after_id,
+        }
+
+        try:
+            with self.engine.connect() as conn:
+                logging.debug(f"Searching by text '{request_msg_desc}'")
+                return self.__fetch(conn, query, params, result_format)
+        except SQLAlchemyError as e:
+            logging.error(f"Error searching by text field: {e}")
+            return False
+
+    @logs
+    def suggest_names(self, table_name, prefix, limit=SUGGEST_LIMIT):
+        """Подсказки по началу имени товара или пользователя: список (id, имя).
+
+        Возвращает None при ошибке запроса, чтобы ее можно было отличить от
+        отсутствия подсказок.
+        """
+        queries = {
+            "products": "SELECT * FROM delivery_schema.suggest_product_names(:prefix, :limit);",
+            "users": "SELECT * FROM delivery_schema.suggest_user_names(:prefix, :limit);",
+        }
+        if not table_name or table_name.lower() not in queries:
+            logging.error(f"Error suggesting names: table '{table_name}' not supported")
+            return []
+
+        if not prefix:
+            return []
+
+        key = (str(self.engine.url), table_name.lower(), prefix.lower(), limit)
+        suggestions = _suggest_cache.get(key)
+        if suggestions is not None:
+            return suggestions
+
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(
+                    text(queries[table_name.lower()]),
+                    {"prefix": prefix, "limit": limit},
+                )
+                suggestions = [tuple(row) for row in result]
+        except SQLAlchemyError as e:
+            logging.error(f"Error suggesting names: {e}")
+            return None
+
+        _suggest_cache.put(key, suggestions)
+        return suggestions
+
+    @logs
+    def place_order(self, user_id, items):
+        """Оформление заказа со всеми позициями за один запрос и одну транзакцию.
+
+        items - список словарей {"product_id": ..., "quantity": ...}.
+        Возвращает кортеж (айди заказа, стоимость заказа) или False при ошибке.
+        """
+        if not user_id or not items:
+            return False
+
+        try:
+            user_id = int(user_id)
+            items = [
+                {
+                    "product_id": int(item["product_id"]),
+                    "quantity": int(item["quantity"]),
+                }
+                for item in items
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error(f"Error placing order: invalid input: {e}")
+            return False
+
+        query = text(
+            "SELECT order_id, total_cost "
+            "FROM delivery_schema.place_order(:user_id, CAST(:items AS jsonb));"
+        )
         try:
             with self.engine.connect() as conn:
                 logging.debug(
-                    f"Adding data to table '{table_name.lower()}' with query: '{query}'"
+                    f"Placing order with {len(items)} items for user '{user_id}'"
                 )
-                return self.__safe_execute(conn, query, params)
+                row = conn.execute(
+                    query, {"user_id": user_id, "items": json.dumps(items)}
+                ).one()
+            self.__track("orders", 1)
+            self.__track("orderitems", len(items))
+            return row.order_id, row.total_cost
         except SQLAlchemyError as e:
-            logging.error(f"Error adding data: {e}")
+            logging.error(f"Error placing order: {e}")
             return False
 
     @logs
-    def search_by_text_field(self, request_msg_desc):
-        """Поиск по заранее выбранному (вами) текстовому не ключевому полю"""
+    def claim_orders(self, worker_id, n=CLAIM_LIMIT):
+        """Захват следующих n ожидающих заказов диспетчером доставки.
+
+        Заказы, захваченные другими диспетчерами, пропускаются без ожидания.
+        Возвращает список захваченных заказов.
+        """
+        if not worker_id or not isinstance(n, int) or n < 1:
+            return []
+
         query = text(
-            "SELECT * FROM delivery_schema.search_products_by_desc(:description);"
+            "SELECT order_id, user_id, order_date, total_cost "
+            "FROM delivery_schema.claim_orders(:worker, :limit);"
         )
-        params = {"description": request_msg_desc}
+        try:
+            with self.engine.connect() as conn:
+                logging.debug(f"Claiming {n} orders for worker '{worker_id}'")
+                orders = conn.execute(
+                    query, {"worker": str(worker_id), "limit": n}
+                ).fetchall()
+            self.__track("orders", len(orders))
+            return orders
+        except SQLAlchemyError as e:
+            logging.error(f"Error claiming orders: {e}")
+            return []
+
+    @logs
+    def complete_orders(self, ids, worker_id=None):
+        """Завершение доставки захваченных заказов.
+
+        Если задан worker_id, завершаются только заказы этого диспетчера.
+        Возвращает число завершенных заказов или False при ошибке.
+        """
+        if not ids:
+            return False
+
+        try:
+            ids = [int(key) for key in ids]
+        except (TypeError, ValueError) as e:
+            logging.error(f"Error completing orders: invalid ids: {e}")
+            return False
 
+        query = text(
+            "SELECT delivery_schema.complete_orders(CAST(:ids AS int[]), :worker);"
+        )
         try:
             with self.engine.connect() as conn:
-                logging.debug(f"Searching by text '{request_msg_desc}'")
-                result = self.__safe_execute(conn, query, params)
-                return result.fetchall()
+                logging.debug(f"Completing {len(ids)} orders")
+                completed = conn.execute(
+                    query,
+                    {"ids": ids, "worker": str(worker_id) if worker_id else None},
+                ).scalar()
+            self.__track("orders", completed)
+            return completed
         except SQLAlchemyError as e:
-            logging.error(f"Error searching by text field: {e}")
+            logging.error(f"Error completing orders: {e}")
             return False
 
+    @logs
+    def archive_orders(
+        self,
+        older_than,
+        batch_size=BATCH_SIZE,
+        status=ARCHIVE_STATUS,
+        progress_callback=None,
+    ):
+        """Перенос заказов старше older_than вместе с позициями в схему delivery_archive.
+
+        Каждая пачка из batch_size заказов переносится отдельной короткой
+        транзакцией, поэтому долгих блокировок нет, а прерванный перенос
+        продолжается следующим вызовом. status=None переносит заказы в любом
+        статусе. progress_callback(report) вызывается после каждой пачки.
+        Возвращает отчет с числом пачек, заказов и позиций и скоростью переноса;
+        при ошибке в отчете есть ключ error, а уже перенесенные пачки остаются в архиве.
+        """
+        report = {"batches": 0, "orders": 0, "items": 0, "seconds": 0.0}
+        if not older_than:
+            return report
+
+        if not isinstance(batch_size, int) or batch_size < 1:
+            report["error"] = f"invalid batch size '{batch_size}'"
+            logging.error(f"Error archiving orders: {report['error']}")
+            return report
+
+        query = text(
+            "SELECT archived_orders, archived_items FROM delivery_schema.archive_orders("
+            "CAST(:older_than AS timestamp), :batch_size, :status);"
+        )
+        params = {"older_than": older_than, "batch_size": batch_size, "status": status}
+        started = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                logging.debug(
+                    f"Archiving orders older than '{older_than}' in batches of {batch_size}"
+                )
+                while True:
+                    row = conn.execute(query, params).one()
+                    if not row.archived_orders:
+                        break
+                    report["batches"] += 1
+                    report["orders"] += row.archived_orders
+                    report["items"] += row.archived_items
+                    report["seconds"] = time.perf_counter() - started
+                    if progress_callback:
+                        progress_callback(report)
+        except SQLAlchemyError as e:
+            logging.error(f"Error archiving orders: {e}")
+            report["error"] = str(e)
+
+        # Триггеры при архивации не меняют другие таблицы
+        if self.maintenance is not None:
+            self.maintenance.record("orders", report["orders"])
+            self.maintenance.record("orderitems", report["items"])
+
+        report["seconds"] = time.perf_counter() - started
+        report["orders_per_second"] = (
+            report["orders"] / report["seconds"] if report["seconds"] else 0.0
+        )
+        return report
+
     @logs
     def update_row(self, table_name, key, data):
         """Обновление кортежа"""
         if not table_name or not data or not key:
             return False
 
-        if table_name not in ["products", "users", "orderitems", "orders"]:
+        if table_name.lower() not in TABLE_COLUMNS:
             logging.error(f"Error updating row: table '{table_name}' not found")
             return False
 
@@ -173,81 +1004,216 @@ class DatabaseManager:
             logging.error(f"Error updating row: key '{key}' is not an integer")
             return False
 
-        query = ""
-        params = {}
         try:
-            logging.debug(
-                f"Updating row with key '{key}' in table '{table_name.lower()}'"
-            )
-            if table_name.lower() == "product":
-                params = {
-                    "key": key,
-                    "name": data["name"],
-                    "description": data["description"],
-                    "price": data["price"],
-                }
-                query = text(
-                    "SELECT delivery_schema.update_cortege(:key, :name, :description, :price);"
-                )
-            elif table_name.lower() == "users":
-                params = {
-                    "key": key,
-                    "name": data["name"],
-                    "email": data["email"],
-                    "phone": data["phone"],
-                    "address": data["address"],
-                }
-                query = text(
-                    "SELECT delivery_schema.update_cortege(:key, :name, :email, :phone, :address);"
-                )
-            elif table_name.lower() == "orderitems":
-                params = {
-                    "key": key,
-                    "order_id": data["order_id"],
-                    "product_id": data["product_id"],
-                    "quantity": data["quantity"],
-                }
-                query = text(
-                    "SELECT delivery_schema.update_cortege(:key, :order_id, :product_id, :quantity);"
+            with self.engine.connect() as conn:
+                logging.debug(
+                    f"Updating row with key '{key}' in table '{table_name.lower()}'"
                 )
-            elif table_name.lower() == "orders":
-                params = {
-                    "key": key,
-                    "user_id": data["user_id"],
-                    "status": data["status"],
-                }
-                query = text(
-                    "SELECT delivery_schema.update_cortege(:key, :user_id, :status);"
+                result = self.__execute_statement(
+                    conn, table_name.lower(), "update", {**data, "key": key}
                 )
-        except Exception as e:
+            if result:
+                self.__track(table_name.lower(), 1)
+            return result
+        except (SQLAlchemyError, KeyError) as e:
             logging.error(f"Error updating row: {e}")
             return False
 
+    @logs
+    def update_rows(self, table_name, rows, chunk_size=BATCH_SIZE):
+        """Пакетное обновление данных: одна пачка = один UPDATE ... FROM unnest.
+
+        Каждая строка - словарь с первичным ключом таблицы и изменяемыми
+        колонками; отсутствующие колонки и None не меняются, строки с
+        неизвестными колонками отклоняются. Если ключ встречается в пачке
+        несколько раз, изменения объединяются по порядку.
+        """
+        report = {"batches": [], "updated": 0, "rejected": []}
+        if not table_name or not rows:
+            return report
+
+        if table_name.lower() not in TABLE_COLUMNS:
+            logging.error(f"Error updating rows: table '{table_name}' not found")
+            return report
+
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            logging.error(f"Error updating rows: invalid chunk size '{chunk_size}'")
+            return report
+
+        key_name = TABLE_KEYS[table_name.lower()]
+        columns = ((key_name, "int"),) + TABLE_COLUMNS[table_name.lower()]
+        names = {name for name, _ in columns}
+        arguments = ", ".join(
+            f"CAST(:{name} AS {sql_type}[])" for name, sql_type in columns
+        )
+        query = text(f"SELECT delivery_schema.update_cortege_batch({arguments});")
+
         try:
             with self.engine.connect() as conn:
                 logging.debug(
-                    f"Updating row with key '{key}' in table '{table_name.lower()}'"
+                    f"Updating rows in table '{table_name.lower()}' in chunks of {chunk_size}"
                 )
-                return self.__safe_execute(conn, query, params)
+                # Ключ -> (номер первой строки, объединенные изменения)
+                chunk = {}
+                for index, row in enumerate(rows):
+                    try:
+                        key = int(row[key_name])
+                        # Неизвестная колонка, скорее всего, опечатка: строку не обновляем
+                        for name in row:
+                            if name not in names:
+                                raise ValueError(f"Unknown column '{name}'")
+                        changes = {
+                            name: value
+                            for name, value in row.items()
+                            if name != key_name and value is not None
+                        }
+                        # Проверяем значения заранее, чтобы отклонить строку целиком
+                        self.__prepare_batch_row(columns[1:], changes, partial=True)
+                    except (KeyError, TypeError, ValueError) as e:
+                        report["rejected"].append({"row": index, "error": str(e)})
+                        continue
+
+                    if key in chunk:
+                        chunk[key][1].update(changes)
+                        continue
+                    chunk[key] = (index, {**changes, key_name: key})
+
+                    if len(chunk) == chunk_size:
+                        report["batches"].append(
+                            self.__update_batch(conn, query, columns, chunk, report)
+                        )
+                        chunk = {}
+
+                if chunk:
+                    report["batches"].append(
+                        self.__update_batch(conn, query, columns, chunk, report)
+                    )
         except SQLAlchemyError as e:
-            logging.error(f"Error updating row: {e}")
-            return False
+            logging.error(f"Error updating rows: {e}")
+
+        report["updated"] = sum(report["batches"])
+        self.__track(table_name.lower(), report["updated"])
+        return report
+
+    @logs
+    def index_advice(self, min_rows=index_advisor.SEQ_SCAN_MIN_ROWS):
+        """Советы по индексам: таблицы с частыми последовательными чтениями,
+        внешние ключи без индексов и самые долгие запросы (если есть pg_stat_statements)
+        """
+        try:
+            with self.engine.connect() as conn:
+                logging.debug("Collecting index advice")
+                return index_advisor.advise(conn, min_rows)
+        except SQLAlchemyError as e:
+            logging.error(f"Error collecting index advice: {e}")
+            return {}
+
+    @logs
+    def maintenance_status(self):
+        """Доля мертвых строк и время последних VACUUM/ANALYZE по таблицам,
+        накопленные изменения и результаты последнего обслуживания
+        """
+        try:
+            with self.engine.connect() as conn:
+                logging.debug("Collecting maintenance statistics")
+                tables = maintenance.table_stats(conn)
+        except SQLAlchemyError as e:
+            logging.error(f"Error collecting maintenance statistics: {e}")
+            return {}
+        if self.maintenance is None:
+            return {"tables": tables}
+        return {"tables": tables, **self.maintenance.status()}
+
+    @logs
+    def run_maintenance(self, tables=None):
+        """Обслуживание таблиц сейчас, не дожидаясь фонового потока.
+
+        tables=None - таблицы, для которых достигнут порог; иначе VACUUM (ANALYZE)
+        перечисленных таблиц. Возвращает список результатов по таблицам.
+        """
+        if tables is not None:
+            tables = [table_name.lower() for table_name in tables]
+            unknown = set(tables) - set(TABLE_KEYS)
+            if unknown:
+                logging.error(
+                    f"Error running maintenance: tables {sorted(unknown)} not found"
+                )
+                return []
+        if self.maintenance is None:
+            logging.error("Error running maintenance: maintenance is not enabled")
+            return []
+        return self.maintenance.run(tables)
+
+    @staticmethod
+    def statement_stats():
+        """Статистика операторов из реестра.
+
+        hits - выполнения, для которых оператор уже был подготовлен на сервере.
+        """
+        with _statement_stats_lock:
+            return {
+                name: {**stats, "hits": stats["executions"] - stats["prepares"]}
+                for name, stats in _statement_stats.items()
+            }
 
     @logs
     def delete_by_text_field(self, request_msg_desc):
-        """Удаление по заранее выбранному текстовому не ключевому полю"""
+        """Удаление по заранее выбранному текстовому не ключевому полю.
+
+        Возвращает число удаленных товаров или False при ошибке.
+        """
         query = text("CALL delivery_schema.delete_products_by_desc(:description);")
         params = {"description": request_msg_desc}
 
         try:
             with self.engine.connect() as conn:
                 logging.debug(f"Deleting by text '{request_msg_desc}'")
-                self.__safe_execute(conn, query, params)
-            return True
+                result = self.__safe_execute(conn, query, params)
+                if not result:
+                    return False
+                deleted = result.scalar() or 0
+            self.__track("products", deleted, cascade=True)
+            return deleted
         except SQLAlchemyError as e:
             logging.error(f"Error deleting by text field: {e}")
             return False
 
+    @logs
+    def delete_records(self, table_name, ids):
+        """Удаление набора записей по списку айди одним запросом.
+
+        Возвращает число удаленных записей или False при ошибке.
+        """
+        if not table_name or not ids:
+            return False
+
+        if table_name.lower() not in TABLE_KEYS:
+            logging.error(f"Error deleting records: table '{table_name}' not found")
+            return False
+
+        try:
+            ids = [int(key) for key in ids]
+        except (TypeError, ValueError) as e:
+            logging.error(f"Error deleting records: invalid ids: {e}")
+            return False
+
+        query = text(
+            "SELECT delivery_schema.delete_records(:table_name, CAST(:ids AS int[]));"
+        )
+        try:
+            with self.engine.connect() as conn:
+                logging.debug(
+                    f"Deleting {len(ids)} records from table '{table_name.lower()}'"
+                )
+                deleted = conn.execute(
+                    query, {"table_name": table_name.lower(), "ids": ids}
+                ).scalar()
+            self.__track(table_name.lower(), deleted, cascade=True)
+            return deleted
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting records: {e}")
+            return False
+
     @logs
     def delete_specific_record(self, table_name, key):
         """Удаление конкретной записи, выбранной пользователем"""
@@ -274,14 +1240,18 @@ class DatabaseManager:
                     f"Deleting record with key '{key}' from table '{table_name.lower()}'"
                 )
                 self.__safe_execute(conn, query, params)
+            self.__track(table_name.lower(), 1, cascade=True)
             return True
         except SQLAlchemyError as e:
             logging.error(f"Error deleting specific record: {e}")
             return False
 
     @logs
-    def close(self):
-        """Закрываем сессию и соединение с базой данных"""
+    def close(self, dispose=False):
+        """Закрываем сессию и освобождаем общий пул соединений.
+
+        Пул остается открытым для других сессий, если не передан dispose=True.
+        """
         if self.session:
             # Закрытие всех активных транзакций, если они есть
             try:
@@ -293,19 +1263,291 @@ class DatabaseManager:
             self.session.close()
             self.session = None
 
-        # Закрытие соединения с базой данных, если оно было установлено
+        # Освобождаем планировщик обслуживания; при dispose=True его поток
+        # останавливается, если планировщиком больше никто не пользуется
+        if self.maintenance:
+            maintenance.release_scheduler(self.maintenance, dispose)
+            self.maintenance = None
+
+        # Освобождаем ссылку на общий пул соединений
         if self.engine:
-            self.engine.dispose()
+            release_engine(self.engine, dispose)
+            self.engine = None
 
-    @logs
-    def __safe_execute(self, conn, query, params):
-        for k, v in params.items():
+    def __detect_file_format(self, source):
+        """Формат файла по расширению пути или имени загруженного файла"""
+        name = (
+            source
+            if isinstance(source, (str, os.PathLike))
+            else getattr(source, "name", "")
+        )
+        return os.path.splitext(str(name))[1].lstrip(".") or "csv"
+
+    def __csv_chunks(self, source, chunk_size):
+        """Чтение CSV пачками по chunk_size строк.
+
+        Возвращает (колонки, CSV-буфер с заголовком, число строк, доля прочитанного).
+        """
+        if isinstance(source, (str, os.PathLike)):
+            binary = open(source, "rb")
+            total = os.path.getsize(source)
+        else:
+            binary = source
+            total = getattr(source, "size", None)
+
+        stream = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+        try:
+            reader = csv.reader(stream)
+            header = [column.strip().lower() for column in next(reader, [])]
+            while True:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(header)
+                rows = 0
+                for row in reader:
+                    writer.writerow(row)
+                    rows += 1
+                    if rows == chunk_size:
+                        break
+                if not rows:
+                    break
+                buffer.seek(0)
+                fraction = min(binary.tell() / total, 1.0) if total else None
+                yield header, buffer, rows, fraction
+        finally:
+            # Загруженный пользователем файл не закрываем, только отвязываем обертку
+            if isinstance(source, (str, os.PathLike)):
+                stream.close()
+            else:
+                stream.detach()
+
+    def __parquet_chunks(self, source, chunk_size):
+        """Чтение Parquet по record batch'ам с конвертацией каждой пачки в CSV"""
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        total = parquet_file.metadata.num_rows
+        header = [column.lower() for column in parquet_file.schema_arrow.names]
+        done = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            buffer = io.BytesIO()
+            pa_csv.write_csv(pa.Table.from_batches([batch]), buffer)
+            buffer.seek(0)
+            done += batch.num_rows
+            yield header, buffer, batch.num_rows, done / total if total else None
+
+    def __fetch(self, conn, query, params, result_format):
+        """Выполнение запроса с результатом в заданном формате.
+
+        Для arrow/numpy результат выгружается через COPY ... TO STDOUT во
+        временный файл и читается pyarrow сразу в колоночные буферы, минуя
+        построчные объекты Python. Параметры проверяются так же, как в
+        __safe_execute, для любого формата.
+        """
+        self.__check_params(params)
+        if result_format == "rows":
+            return conn.execute(query, params).fetchall()
+
+        compiled = query.compile(dialect=self.engine.dialect)
+        cursor = conn.connection.cursor()
+        select = (
+            cursor.mogrify(str(compiled), compiled.construct_params(params))
+            .decode()
+            .strip()
+            .rstrip(";")
+        )
+        cursor.execute(f"SELECT * FROM ({select}) AS result LIMIT 0")
+        schema = columnar.arrow_schema(cursor.description)
+
+        with tempfile.SpooledTemporaryFile(max_size=EXPORT_CHUNK_BYTES) as buffer:
+            cursor.copy_expert(
+                f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer
+            )
+            buffer.seek(0)
+            table = columnar.read_csv_table(buffer, schema)
+        return columnar.convert_table(table, result_format)
+
+    def __execute_statement(self, conn, table_name, operation, data):
+        """Выполнение оператора из реестра с подготовкой на сервере при первом вызове на соединении"""
+        statement = STATEMENTS[(table_name, operation)]
+        params = {param: data[param] for param in statement.params}
+
+        # Подготовленные операторы живут столько же, сколько соединение в пуле
+        prepared = conn.connection.info.setdefault("prepared_statements", set())
+        if statement.name not in prepared:
+            conn.execute(statement.prepare)
+            prepared.add(statement.name)
+            with _statement_stats_lock:
+                _statement_stats[statement.name]["prepares"] += 1
+
+        # Неудачные выполнения (ошибка SQL или недопустимые параметры) не учитываются
+        result = self.__safe_execute(conn, statement.execute, params)
+        if result is not False:
+            with _statement_stats_lock:
+                _statement_stats[statement.name]["executions"] += 1
+        return result
+
+    def __build_filters(self, filters):
+        """Условия WHERE по словарю {колонка: значение} с экранированием имен колонок"""
+        if not filters:
+            return "", {}
+
+        preparer = self.engine.dialect.identifier_preparer
+        conditions = []
+        params = {}
+        for position, (column, value) in enumerate(filters.items()):
+            name = f"filter_{position}"
+            if isinstance(value, (list, tuple, set)):
+                conditions.append(f"{preparer.quote(column)} = ANY(:{name})")
+                params[name] = list(value)
+            elif value is None:
+                conditions.append(f"{preparer.quote(column)} IS NULL")
+            else:
+                conditions.append(f"{preparer.quote(column)} = :{name}")
+                params[name] = value
+        return " AND ".join(conditions), params
+
+    def __stream_rows(self, query, params, batch_size):
+        """Генератор строк из именованного серверного курсора"""
+        try:
+            with self.engine.connect() as conn:
+                # Серверный курсор живет только внутри транзакции
+                conn.execution_options(isolation_level="READ COMMITTED")
+                with conn.begin():
+                    result = conn.execution_options(
+                        stream_results=True, yield_per=batch_size
+                    ).execute(query, params)
+                    for partition in result.partitions():
+                        yield from partition
+        except SQLAlchemyError as e:
+            logging.error(f"Error reading rows: {e}")
+
+    def __copy_out(self, copy_sql, chunk_size):
+        """Генератор пачек COPY ... TO STDOUT.
+
+        COPY выполняется в отдельном потоке и пишет в очередь ограниченной
+        длины, поэтому медленный потребитель притормаживает чтение из базы.
+        """
+        chunks = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        cancelled = threading.Event()
+        finished = object()
+
+        def put(item):
+            while not cancelled.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+            raise InterruptedError("Export cancelled by consumer")
+
+        def copy():
+            writer = _QueueWriter(put, chunk_size)
+            try:
+                with self.engine.connect() as conn:
+                    conn.connection.cursor().copy_expert(copy_sql, writer)
+                writer.flush()
+                put(finished)
+            except InterruptedError:
+                pass
+            except Exception as e:
+                logging.error(f"Error exporting data: {e}")
+                try:
+                    put(e)
+                except InterruptedError:
+                    pass
+
+        threading.Thread(target=copy, daemon=True).start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is finished:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    def __prepare_batch_row(self, columns, row, partial=False):
+        """Приведение строки пачки к типам колонок таблицы.
+
+        При partial отсутствующие в строке колонки передаются как NULL.
+        """
+        values = []
+        for name, sql_type in columns:
+            value = row.get(name) if partial else row[name]
+            if value is not None:
+                value = int(value) if sql_type == "int" else str(value)
+            if isinstance(value, str) and (";" in value or "--" in value):
+                raise ValueError(f"Invalid characters in column '{name}'")
+            if isinstance(value, str) and name != "description":
+                value = value.strip()
+            values.append(value)
+        return values
+
+    def __execute_batch(self, conn, query, columns, chunk, report):
+        """Выполнение пачки одним запросом.
+
+        Если база отклонила пачку, она делится пополам, пока не будут
+        найдены конкретные строки с ошибкой. Возвращает число затронутых строк.
+        """
+        params = {
+            name: [values[position] for _, values in chunk]
+            for position, (name, _) in enumerate(columns)
+        }
+        try:
+            return conn.execute(query, params).scalar() or 0
+        except SQLAlchemyError as e:
+            if len(chunk) == 1:
+                logging.error(f"Row {chunk[0][0]} rejected: {e}")
+                report["rejected"].append(
+                    {"row": chunk[0][0], "error": str(getattr(e, "orig", e))}
+                )
+                return 0
+            middle = len(chunk) // 2
+            return self.__execute_batch(
+                conn, query, columns, chunk[:middle], report
+            ) + self.__execute_batch(conn, query, columns, chunk[middle:], report)
+
+    def __update_batch(self, conn, query, columns, chunk, report):
+        """Обновление пачки {ключ: (номер строки, изменения)} одним запросом"""
+        rows = [
+            (index, self.__prepare_batch_row(columns, changes, partial=True))
+            for index, changes in chunk.values()
+        ]
+        return self.__execute_batch(conn, query, columns, rows, report)
+
+    def __track(self, table_name, rows, cascade=False):
+        """Учет строк, измененных операцией записи, для планировщика обслуживания.
+
+        rows=None - таблица очищена целиком. Вместе с таблицей учитываются таблицы,
+        которые меняют триггеры, а при удалении (cascade=True) - и каскадное удаление.
+        """
+        if self.maintenance is None or (not rows and rows is not None):
+            return
+        related = CASCADE_TABLES if cascade else TRIGGER_TABLES
+        for name in (table_name, *related.get(table_name, ())):
+            self.maintenance.record(name, rows)
+
+    @staticmethod
+    def __check_params(params):
+        """Проверка строковых параметров запроса и обрезка пробелов (кроме description)"""
+        for k, v in (params or {}).items():
+            if not isinstance(v, str):
+                continue
             if ";" in v or "--" in v:
                 logging.error("Invalid characters in input")
                 raise ValueError("Invalid characters in input")
             if k != "description":
                 params[k] = v.strip()
 
+    @logs
+    def __safe_execute(self, conn, query, params):
+        self.__check_params(params)
+
         try:
             if params is None:
                 return conn.execute(query)
@@ -313,3 +1555,23 @@ class DatabaseManager:
         except SQLAlchemyError as e:
             logging.error(f"SQL execution failed: {e}")
             return False
+
+
+class _QueueWriter:
+    """Файловый объект для copy_expert: собирает данные в пачки и передает их в очередь"""
+
+    def __init__(self, put, chunk_size):
+        self._put = put
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data.encode() if isinstance(data, str) else data
+        if len(self._buffer) >= self._chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer = bytearray()
@@ -0,0 +1,125 @@
+"""Советы по индексам на основе статистики PostgreSQL (pg_stat_user_tables, pg_stat_statements)"""
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Схема, таблицы которой анализируются
+SCHEMA = "delivery_tables_schema"
+
+# Таблица считается часто читаемой последовательно, если в ней не меньше
+# SEQ_SCAN_MIN_ROWS строк и последовательных чтений больше, чем индексных
+SEQ_SCAN_MIN_ROWS = 1000
+
+# Число самых долгих запросов из pg_stat_statements в отчете
+SLOW_STATEMENTS_LIMIT = 10
+
+SEQ_SCAN_TABLES = text(
+    """
+    SELECT relname AS table_name,
+           n_live_tup AS live_rows,
+           seq_scan,
+           seq_tup_read,
+           COALESCE(idx_scan, 0) AS idx_scan
+    FROM pg_stat_user_tables
+    WHERE schemaname = :schema
+      AND n_live_tup >= :min_rows
+      AND seq_scan > COALESCE(idx_scan, 0)
+    ORDER BY seq_tup_read DESC
+    """
+)
+
+# Внешние ключи, для которых нет индекса, начинающегося с колонок ключа.
+# Копии ключа на секциях пропускаются: индекс на секционированной таблице
+# создается без CONCURRENTLY (PostgreSQL его не поддерживает) и сразу на всех секциях
+UNINDEXED_FOREIGN_KEYS = text(
+    """
+    SELECT c.conrelid::regclass::text AS table_name,
+           c.conname AS constraint_name,
+           array_agg(a.attname::text ORDER BY k.position) AS columns,
+           format(
+               CASE WHEN r.relkind = 'p'
+                    THEN 'CREATE INDEX ON %s (%s)'
+                    ELSE 'CREATE INDEX CONCURRENTLY ON %s (%s)'
+               END,
+               c.conrelid::regclass,
+               string_agg(quote_ident(a.attname), ', ' ORDER BY k.position)
+           ) AS suggestion
+    FROM pg_constraint c
+    JOIN pg_class r ON r.oid = c.conrelid
+    CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, position)
+    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+    WHERE c.contype = 'f'
+      AND c.connamespace = CAST(:schema AS regnamespace)
+      AND c.conparentid = 0
+      AND NOT EXISTS (
+          SELECT 1
+          FROM pg_index i
+          WHERE i.indrelid = c.conrelid
+            AND (i.indkey::int2[])[0:cardinality(c.conkey) - 1] @> c.conkey
+      )
+    GROUP BY c.conrelid, c.conname, r.relkind
+    ORDER BY table_name, constraint_name
+    """
+)
+
+PG_STAT_STATEMENTS_INSTALLED = text(
+    "SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'"
+)
+
+SLOW_STATEMENTS = text(
+    """
+    SELECT query,
+           calls,
+           total_exec_time,
+           mean_exec_time,
+           rows
+    FROM pg_stat_statements
+    WHERE query ILIKE '%' || :schema || '%'
+    ORDER BY total_exec_time DESC
+    LIMIT :limit
+    """
+)
+
+
+def seq_scan_tables(conn, min_rows=SEQ_SCAN_MIN_ROWS):
+    """Таблицы, которые чаще читаются последовательно, чем по индексу"""
+    return [
+        dict(row._mapping)
+        for row in conn.execute(
+            SEQ_SCAN_TABLES, {"schema": SCHEMA, "min_rows": min_rows}
+        )
+    ]
+
+
+def unindexed_foreign_keys(conn):
+    """Внешние ключи без индекса и команда для его создания"""
+    return [
+        dict(row._mapping)
+        for row in conn.execute(UNINDEXED_FOREIGN_KEYS, {"schema": SCHEMA})
+    ]
+
+
+def slow_statements(conn, limit=SLOW_STATEMENTS_LIMIT):
+    """Самые долгие запросы к таблицам схемы, если установлен pg_stat_statements"""
+    if conn.execute(PG_STAT_STATEMENTS_INSTALLED).first() is None:
+        return []
+    try:
+        return [
+            dict(row._mapping)
+            for row in conn.execute(SLOW_STATEMENTS, {"schema": SCHEMA, "limit": limit})
+        ]
+    except SQLAlchemyError:
+        # Расширение создано, но не загружено через shared_preload_libraries
+        # или у пользователя нет прав на чтение статистики
+        return []
+
+
+def advise(conn, min_rows=SEQ_SCAN_MIN_ROWS, limit=SLOW_STATEMENTS_LIMIT):
+    """Отчет по индексам: последовательные чтения, внешние ключи без индексов и долгие запросы"""
+    foreign_keys = unindexed_foreign_keys(conn)
+    return {
+        "seq_scan_tables": seq_scan_tables(conn, min_rows),
+        "unindexed_foreign_keys": foreign_keys,
+        "slow_statements": slow_statements(conn, limit),
+        "candidate_indexes": [key["suggestion"] for key in foreign_keys],
+    }
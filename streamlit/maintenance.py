@@ -0,0 +1,351 @@
+"""Обслуживание таблиц после массовых операций: ANALYZE, VACUUM и REINDEX.
+
+DatabaseManager сообщает планировщику, сколько строк каждой таблицы изменила
+операция записи. Когда изменений накапливается больше порога, фоновый поток
+выполняет ANALYZE или VACUUM (ANALYZE) и перестраивает раздутые индексы
+(если установлено расширение pgstattuple).
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from logger import logging
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Схема, таблицы которой обслуживаются
+SCHEMA = "delivery_tables_schema"
+
+# Число измененных строк таблицы, после которого выполняется ANALYZE
+ANALYZE_THRESHOLD = 10000
+
+# Число измененных строк таблицы, после которого выполняется VACUUM (ANALYZE)
+VACUUM_THRESHOLD = 50000
+
+# Индекс перестраивается, если средняя заполненность его листовых страниц
+# (в процентах, по pgstatindex) ниже порога. Индексы меньше REINDEX_MIN_PAGES
+# страниц не проверяются
+REINDEX_MIN_LEAF_DENSITY = 50
+REINDEX_MIN_PAGES = 128
+
+# Обслуживание начинается, когда в течение QUIET_PERIOD секунд не было новых
+# изменений, чтобы не мешать идущей массовой операции
+QUIET_PERIOD = 5
+
+# Через сколько секунд повторяется обслуживание, которое завершилось ошибкой
+RETRY_INTERVAL = 60
+
+TABLE_STATS = text(
+    """
+    SELECT relname AS table_name,
+           n_live_tup AS live_rows,
+           n_dead_tup AS dead_rows,
+           round(n_dead_tup::numeric / NULLIF(n_live_tup + n_dead_tup, 0), 3) AS dead_ratio,
+           n_mod_since_analyze AS modified_since_analyze,
+           GREATEST(last_vacuum, last_autovacuum) AS last_vacuum,
+           GREATEST(last_analyze, last_autoanalyze) AS last_analyze
+    FROM pg_stat_user_tables
+    WHERE schemaname = :schema
+    ORDER BY dead_ratio DESC NULLS LAST, table_name
+    """
+)
+
+PGSTATTUPLE_INSTALLED = text("SELECT 1 FROM pg_extension WHERE extname = 'pgstattuple'")
+
+# B-tree индексы таблицы и ее секций с низкой заполненностью листовых страниц
+BLOATED_INDEXES = text(
+    """
+    SELECT c.oid::regclass::text AS index_name,
+           s.avg_leaf_density,
+           s.leaf_fragmentation
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_am am ON am.oid = c.relam
+    CROSS JOIN LATERAL pgstatindex(c.oid::regclass) s
+    WHERE i.indrelid IN (
+            SELECT CAST(:table_name AS regclass)
+            UNION ALL
+            SELECT inhrelid FROM pg_inherits WHERE inhparent = CAST(:table_name AS regclass)
+          )
+      AND c.relkind = 'i'
+      AND am.amname = 'btree'
+      AND c.relpages >= :min_pages
+      AND s.avg_leaf_density < :min_density
+    ORDER BY s.avg_leaf_density
+    """
+)
+
+
+def table_stats(conn):
+    """Живые и мертвые строки таблиц схемы и время последних VACUUM и ANALYZE"""
+    return [dict(row._mapping) for row in conn.execute(TABLE_STATS, {"schema": SCHEMA})]
+
+
+def bloated_indexes(
+    conn, table_name, min_density=REINDEX_MIN_LEAF_DENSITY, min_pages=REINDEX_MIN_PAGES
+):
+    """Раздутые индексы таблицы, если установлен pgstattuple"""
+    if conn.execute(PGSTATTUPLE_INSTALLED).first() is None:
+        return []
+    try:
+        return [
+            dict(row._mapping)
+            for row in conn.execute(
+                BLOATED_INDEXES,
+                {
+                    "table_name": table_name,
+                    "min_density": min_density,
+                    "min_pages": min_pages,
+                },
+            )
+        ]
+    except SQLAlchemyError as e:
+        # У пользователя нет прав на pgstatindex
+        logging.error(f"Error checking index bloat of {table_name}: {e}")
+        return []
+
+
+class MaintenanceScheduler:
+    """Счетчики измененных строк по таблицам и фоновый поток обслуживания.
+
+    Обслуживание идет через отдельное соединение с теми же учетными данными, что
+    и у engine, чтобы долгий VACUUM не занимал соединения общего пула.
+    Обслуживать таблицы может только их владелец.
+    """
+
+    def __init__(
+        self,
+        engine,
+        analyze_threshold=ANALYZE_THRESHOLD,
+        vacuum_threshold=VACUUM_THRESHOLD,
+        reindex_min_density=REINDEX_MIN_LEAF_DENSITY,
+        quiet_period=QUIET_PERIOD,
+    ):
+        # VACUUM и REINDEX CONCURRENTLY не выполняются внутри транзакции
+        self.engine = create_engine(
+            engine.url,
+            isolation_level="AUTOCOMMIT",
+            pool_size=1,
+            max_overflow=0,
+            pool_pre_ping=True,
+        )
+        self.analyze_threshold = analyze_threshold
+        self.vacuum_threshold = vacuum_threshold
+        self.reindex_min_density = reindex_min_density
+        self.quiet_period = quiet_period
+        # Таблица -> число измененных строк с последнего обслуживания
+        self._pending = {}
+        # Таблицы, очищенные целиком
+        self._cleared = set()
+        # Таблица -> результат последнего обслуживания
+        self._history = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self.__loop, name="maintenance", daemon=True
+        )
+        self._thread.start()
+
+    def configure(
+        self, analyze_threshold=None, vacuum_threshold=None, reindex_min_density=None
+    ):
+        """Изменение порогов, None оставляет прежнее значение"""
+        with self._lock:
+            if analyze_threshold is not None:
+                self.analyze_threshold = analyze_threshold
+            if vacuum_threshold is not None:
+                self.vacuum_threshold = vacuum_threshold
+            if reindex_min_density is not None:
+                self.reindex_min_density = reindex_min_density
+            due = self.__due()
+        if due:
+            self._wake.set()
+
+    def record(self, table_name, rows=None):
+        """Учет измененных строк таблицы. rows=None - таблица очищена целиком"""
+        with self._lock:
+            if rows is None:
+                self._cleared.add(table_name)
+            elif rows > 0:
+                self._pending[table_name] = self._pending.get(table_name, 0) + rows
+            else:
+                return
+            self._last_write = time.monotonic()
+            due = self.__due()
+        if due:
+            self._wake.set()
+
+    def run(self, tables=None):
+        """Обслуживание таблиц в текущем потоке.
+
+        tables=None - таблицы, для которых достигнут порог; иначе для
+        перечисленных таблиц выполняется VACUUM (ANALYZE) независимо от порогов.
+        Возвращает список результатов по таблицам. Счетчики таблицы сбрасываются
+        только после успешного обслуживания, при ошибке таблица остается в очереди.
+        """
+        with self._run_lock:
+            with self._lock:
+                if tables is None:
+                    due = self.__due()
+                else:
+                    due = {table_name: "vacuum" for table_name in tables}
+                min_density = self.reindex_min_density
+
+            results = []
+            for table_name, action in due.items():
+                with self._lock:
+                    rows = self._pending.get(table_name, 0)
+                    cleared = table_name in self._cleared
+                entry = self.__maintain(table_name, action, min_density)
+                if entry["error"] is None:
+                    self.__reset(table_name, rows, cleared)
+                results.append(entry)
+            return results
+
+    def status(self):
+        """Накопленные изменения, пороги и результаты последнего обслуживания"""
+        with self._lock:
+            pending = dict(self._pending)
+            pending.update({table_name: None for table_name in self._cleared})
+            return {
+                "pending": pending,
+                "analyze_threshold": self.analyze_threshold,
+                "vacuum_threshold": self.vacuum_threshold,
+                "reindex_min_density": self.reindex_min_density,
+                "history": list(self._history.values()),
+            }
+
+    def stop(self, timeout=None):
+        """Остановка фонового потока"""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def __reset(self, table_name, rows, cleared):
+        """Сброс обслуженных изменений; строки, измененные во время обслуживания, остаются"""
+        with self._lock:
+            rows = self._pending.pop(table_name, 0) - rows
+            if rows > 0:
+                self._pending[table_name] = rows
+            if cleared:
+                self._cleared.discard(table_name)
+
+    def __due(self):
+        """Таблицы, для которых достигнут порог, и нужное действие. Вызывается под self._lock"""
+        due = {table_name: "vacuum" for table_name in self._cleared}
+        for table_name, rows in self._pending.items():
+            if rows >= self.vacuum_threshold:
+                due[table_name] = "vacuum"
+            elif rows >= self.analyze_threshold:
+                due.setdefault(table_name, "analyze")
+        return due
+
+    def __loop(self):
+        retry = None
+        while not self._stopped.is_set():
+            # После ошибки обслуживание повторяется через RETRY_INTERVAL и без новых записей
+            self._wake.wait(retry)
+            self._wake.clear()
+
+            # Ждем окончания массовой операции
+            while not self._stopped.is_set():
+                with self._lock:
+                    idle = time.monotonic() - self._last_write
+                if idle >= self.quiet_period:
+                    break
+                self._stopped.wait(self.quiet_period - idle)
+            if self._stopped.is_set():
+                break
+
+            try:
+                results = self.run()
+            except Exception as e:
+                logging.error(f"Error running table maintenance: {e}")
+                results = [{"error": str(e)}]
+            retry = RETRY_INTERVAL if any(r["error"] for r in results) else None
+
+        self.engine.dispose()
+
+    def __maintain(self, table_name, action, min_density):
+        """ANALYZE или VACUUM (ANALYZE) таблицы и перестройка ее раздутых индексов"""
+        entry = {"table": table_name, "action": action, "reindexed": [], "error": None}
+        started = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                table = f"{SCHEMA}.{conn.dialect.identifier_preparer.quote(table_name)}"
+                logging.debug(f"Running {action} on {table}")
+                if action == "vacuum":
+                    conn.execute(text(f"VACUUM (ANALYZE) {table};"))
+                    for index in bloated_indexes(conn, table, min_density):
+                        conn.execute(
+                            text(f"REINDEX INDEX CONCURRENTLY {index['index_name']};")
+                        )
+                        entry["reindexed"].append(index["index_name"])
+                else:
+                    conn.execute(text(f"ANALYZE {table};"))
+        except SQLAlchemyError as e:
+            logging.error(f"Error maintaining table {table_name}: {e}")
+            entry["error"] = str(e)
+
+        entry["seconds"] = time.perf_counter() - started
+        entry["finished_at"] = datetime.now()
+        with self._lock:
+            self._history[table_name] = entry
+        return entry
+
+
+# Общие для процесса планировщики по движку
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(engine, **settings):
+    """Общий планировщик для движка: создается и запускается один раз на процесс.
+
+    settings - пороги MaintenanceScheduler; для уже созданного планировщика
+    применяются через configure. Каждый вызов нужно закрыть release_scheduler.
+    """
+    with _schedulers_lock:
+        entry = _schedulers.get(engine)
+        if entry is None:
+            entry = _schedulers[engine] = {
+                "scheduler": MaintenanceScheduler(engine, **settings),
+                "handles": 1,
+            }
+            return entry["scheduler"]
+        entry["handles"] += 1
+        scheduler = entry["scheduler"]
+    if settings:
+        scheduler.configure(
+            **{
+                name: value
+                for name, value in settings.items()
+                if name != "quiet_period"
+            }
+        )
+    return scheduler
+
+
+def release_scheduler(scheduler, stop=False):
+    """Освобождение ссылки на общий планировщик.
+
+    Поток останавливается только при stop=True и только если планировщиком
+    больше никто не пользуется.
+    """
+    with _schedulers_lock:
+        for engine, entry in list(_schedulers.items()):
+            if entry["scheduler"] is not scheduler:
+                continue
+            entry["handles"] = max(entry["handles"] - 1, 0)
+            if not stop or entry["handles"]:
+                return
+            del _schedulers[engine]
+            break
+        else:
+            return
+    # Не ждем завершения уже начатого обслуживания
+    scheduler.stop(timeout=0)
@@ -0,0 +1,43 @@
+"""name prefix indexes
+
+Revision ID: 2d9e7a41c0b3
+Revises: 8f3c1d2a6b47
+Create Date: 2026-10-18 11:02:17.904415
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2d9e7a41c0b3"
+down_revision = "8f3c1d2a6b47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Индексы для подсказок по началу имени при любой collation базы
+    op.create_index(
+        "pattern_idx_product_name",
+        "Products",
+        [sa.text("lower(name) text_pattern_ops")],
+        schema="delivery_tables_schema",
+    )
+    op.create_index(
+        "pattern_idx_username",
+        "Users",
+        [sa.text("lower(name) text_pattern_ops")],
+        schema="delivery_tables_schema",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "pattern_idx_username", table_name="Users", schema="delivery_tables_schema"
+    )
+    op.drop_index(
+        "pattern_idx_product_name",
+        table_name="Products",
+        schema="delivery_tables_schema",
+    )
@@ -0,0 +1,105 @@
+"""order item unit price
+
+Revision ID: 6c1f4b9e2d85
+Revises: 2d9e7a41c0b3
+Create Date: 2026-10-18 14:26:53.118902
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6c1f4b9e2d85"
+down_revision = "2d9e7a41c0b3"
+branch_labels = None
+depends_on = None
+
+# Число позиций, которые заполняются одной транзакцией
+BACKFILL_BATCH_SIZE = 10000
+
+# Заполнение пачки позиций по возрастанию ключа текущими ценами товаров.
+# Возвращает последний ключ пачки или NULL, если позиции закончились
+BACKFILL = sa.text(
+    """
+    WITH batch AS (
+        SELECT order_item_id
+        FROM delivery_tables_schema."OrderItems"
+        WHERE order_item_id > :last_id
+        ORDER BY order_item_id
+        LIMIT :batch_size
+    ), filled AS (
+        UPDATE delivery_tables_schema."OrderItems" oi
+        SET unit_price = p.price
+        FROM batch, delivery_tables_schema."Products" p
+        WHERE oi.order_item_id = batch.order_item_id
+          AND oi.unit_price IS NULL
+          AND p.product_id = oi.product_id
+    )
+    SELECT max(order_item_id) FROM batch
+    """
+)
+
+# Фиксация цены товара в позиции: при вставке без цены и при смене товара.
+# Функции стоимости заказов и их триггеры создаются database/2_delivery.sql
+SET_UNIT_PRICE = """
+CREATE OR REPLACE FUNCTION delivery_schema.set_unit_price() RETURNS TRIGGER AS $$
+BEGIN
+    SELECT price INTO NEW.unit_price
+    FROM delivery_tables_schema."Products"
+    WHERE product_id = NEW.product_id;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER set_unit_price_insert_trigger
+BEFORE INSERT ON delivery_tables_schema."OrderItems"
+FOR EACH ROW
+WHEN (NEW.unit_price IS NULL)
+EXECUTE FUNCTION delivery_schema.set_unit_price();
+
+CREATE TRIGGER set_unit_price_update_trigger
+BEFORE UPDATE OF product_id ON delivery_tables_schema."OrderItems"
+FOR EACH ROW
+WHEN (
+    NEW.product_id IS DISTINCT FROM OLD.product_id
+    AND NEW.unit_price IS NOT DISTINCT FROM OLD.unit_price
+)
+EXECUTE FUNCTION delivery_schema.set_unit_price();
+"""
+
+
+def upgrade() -> None:
+    # Цена товара на момент добавления позиции
+    op.add_column(
+        "OrderItems",
+        sa.Column("unit_price", sa.Integer, nullable=True),
+        schema="delivery_tables_schema",
+    )
+
+    # Новые позиции получают цену триггером
+    op.execute("CREATE SCHEMA IF NOT EXISTS delivery_schema")
+    op.execute(SET_UNIT_PRICE)
+
+    # Каждая пачка фиксируется отдельно, чтобы не держать блокировки на всей таблице
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        last_id = 0
+        while last_id is not None:
+            last_id = conn.execute(
+                BACKFILL, {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE}
+            ).scalar()
+
+
+def downgrade() -> None:
+    for trigger_name in (
+        "set_unit_price_insert_trigger",
+        "set_unit_price_update_trigger",
+    ):
+        op.execute(
+            f"DROP TRIGGER IF EXISTS {trigger_name} "
+            'ON delivery_tables_schema."OrderItems"'
+        )
+    op.execute("DROP FUNCTION IF EXISTS delivery_schema.set_unit_price()")
+    op.drop_column("OrderItems", "unit_price", schema="delivery_tables_schema")
@@ -0,0 +1,51 @@
+"""product search indexes
+
+Revision ID: 8f3c1d2a6b47
+Revises: 5b30d6842205
+Create Date: 2026-10-18 10:12:41.532107
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8f3c1d2a6b47"
+down_revision = "5b30d6842205"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Триграммы для ILIKE по подстроке и префиксу
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public")
+    op.create_index(
+        "trgm_idx_product_description",
+        "Products",
+        ["description"],
+        schema="delivery_tables_schema",
+        postgresql_using="gin",
+        postgresql_ops={"description": "gin_trgm_ops"},
+    )
+
+    # Полнотекстовый поиск по описанию
+    op.create_index(
+        "fts_idx_product_description",
+        "Products",
+        [sa.text("to_tsvector('simple', COALESCE(description, ''))")],
+        schema="delivery_tables_schema",
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "fts_idx_product_description",
+        table_name="Products",
+        schema="delivery_tables_schema",
+    )
+    op.drop_index(
+        "trgm_idx_product_description",
+        table_name="Products",
+        schema="delivery_tables_schema",
+    )
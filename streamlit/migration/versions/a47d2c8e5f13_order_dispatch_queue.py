@@ -0,0 +1,53 @@
+"""order dispatch queue
+
+Revision ID: a47d2c8e5f13
+Revises: 6c1f4b9e2d85
+Create Date: 2026-10-18 15:08:31.640275
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a47d2c8e5f13"
+down_revision = "6c1f4b9e2d85"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Диспетчер, взявший заказ в работу, и время захвата
+    op.add_column(
+        "Orders",
+        sa.Column("claimed_by", sa.String(50), nullable=True),
+        schema="delivery_tables_schema",
+    )
+    op.add_column(
+        "Orders",
+        sa.Column("claimed_at", sa.TIMESTAMP, nullable=True),
+        schema="delivery_tables_schema",
+    )
+
+    # Очередь ожидающих заказов строится без блокировки записи в Orders
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "pending_idx_order_date",
+            "Orders",
+            ["order_date"],
+            schema="delivery_tables_schema",
+            postgresql_where=sa.text("status = 'Pending'"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "pending_idx_order_date",
+            table_name="Orders",
+            schema="delivery_tables_schema",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("Orders", "claimed_at", schema="delivery_tables_schema")
+    op.drop_column("Orders", "claimed_by", schema="delivery_tables_schema")
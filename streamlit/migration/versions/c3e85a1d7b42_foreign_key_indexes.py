@@ -0,0 +1,46 @@
+"""foreign key indexes
+
+Revision ID: c3e85a1d7b42
+Revises: a47d2c8e5f13
+Create Date: 2026-10-18 15:47:12.305816
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3e85a1d7b42"
+down_revision = "a47d2c8e5f13"
+branch_labels = None
+depends_on = None
+
+# (имя индекса, таблица, колонка внешнего ключа)
+FOREIGN_KEY_INDEXES = (
+    ("fk_idx_orders_user_id", "Orders", "user_id"),
+    ("fk_idx_orderitems_order_id", "OrderItems", "order_id"),
+    ("fk_idx_orderitems_product_id", "OrderItems", "product_id"),
+)
+
+
+def upgrade() -> None:
+    # Индексы строятся без блокировки записи в таблицы
+    with op.get_context().autocommit_block():
+        for index_name, table_name, column in FOREIGN_KEY_INDEXES:
+            op.create_index(
+                index_name,
+                table_name,
+                [column],
+                schema="delivery_tables_schema",
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name, table_name, _ in reversed(FOREIGN_KEY_INDEXES):
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                schema="delivery_tables_schema",
+                postgresql_concurrently=True,
+            )
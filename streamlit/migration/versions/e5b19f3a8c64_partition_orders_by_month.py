@@ -0,0 +1,351 @@
+"""partition orders by month
+
+Revision ID: e5b19f3a8c64
+Revises: c3e85a1d7b42
+Create Date: 2026-10-18 16:35:40.271953
+
+"""
+
+import datetime
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5b19f3a8c64"
+down_revision = "c3e85a1d7b42"
+branch_labels = None
+depends_on = None
+
+SCHEMA = "delivery_tables_schema"
+
+# Сколько месяцев вперед создаются секции сверх уже существующих данных
+PARTITION_MONTHS_AHEAD = 3
+
+# Пользовательские триггеры таблицы (например, из database/2_delivery.sql)
+TRIGGERS = sa.text(
+    """
+    SELECT pg_get_triggerdef(t.oid)
+    FROM pg_trigger t
+    WHERE t.tgrelid = CAST(:table_name AS regclass) AND NOT t.tgisinternal
+    ORDER BY t.tgname
+    """
+)
+
+# Секции таблицы
+PARTITIONS = sa.text(
+    """
+    SELECT inhrelid::regclass::text
+    FROM pg_inherits
+    WHERE inhparent = CAST(:table_name AS regclass)
+    """
+)
+
+# Права на таблицу, выданные другим ролям
+GRANTS = sa.text(
+    """
+    SELECT grantee, string_agg(privilege_type, ', ') AS privileges
+    FROM information_schema.role_table_grants
+    WHERE table_schema = :schema AND table_name = :table_name
+      AND grantee <> current_user
+    GROUP BY grantee
+    """
+)
+
+ORDERS_COLUMNS = (
+    "order_id, user_id, order_date, total_cost, status, claimed_by, claimed_at"
+)
+ORDER_ITEMS_COLUMNS = (
+    "order_item_id, order_id, order_date, product_id, quantity, unit_price"
+)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    saved = _save_table_state(conn)
+
+    # Старые таблицы переименовываются вместе с ограничениями и индексами,
+    # имена которых должны быть уникальны в схеме
+    _rename_old_tables()
+
+    op.create_table(
+        "Orders",
+        sa.Column(
+            "order_id",
+            sa.Integer,
+            nullable=False,
+            server_default=sa.text(f"nextval('{saved['orders_sequence']}'::regclass)"),
+        ),
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("delivery_tables_schema.Users.user_id", ondelete="CASCADE"),
+        ),
+        sa.Column(
+            "order_date",
+            sa.TIMESTAMP,
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        sa.Column("total_cost", sa.Integer, server_default=sa.text("0")),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("claimed_by", sa.String(50), nullable=True),
+        sa.Column("claimed_at", sa.TIMESTAMP, nullable=True),
+        sa.PrimaryKeyConstraint("order_id", "order_date", name="Orders_pkey"),
+        schema=SCHEMA,
+        postgresql_partition_by="RANGE (order_date)",
+    )
+    op.create_table(
+        "OrderItems",
+        sa.Column(
+            "order_item_id",
+            sa.Integer,
+            nullable=False,
+            server_default=sa.text(
+                f"nextval('{saved['order_items_sequence']}'::regclass)"
+            ),
+        ),
+        sa.Column("order_id", sa.Integer),
+        sa.Column("order_date", sa.TIMESTAMP, nullable=False),
+        sa.Column(
+            "product_id",
+            sa.Integer,
+            sa.ForeignKey(
+                "delivery_tables_schema.Products.product_id", ondelete="CASCADE"
+            ),
+        ),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("unit_price", sa.Integer, nullable=True),
+        sa.CheckConstraint("quantity > 0", name="positive_quantity"),
+        sa.PrimaryKeyConstraint("order_item_id", "order_date", name="OrderItems_pkey"),
+        sa.ForeignKeyConstraint(
+            ["order_id", "order_date"],
+            [
+                "delivery_tables_schema.Orders.order_id",
+                "delivery_tables_schema.Orders.order_date",
+            ],
+            ondelete="CASCADE",
+        ),
+        schema=SCHEMA,
+        postgresql_partition_by="RANGE (order_date)",
+    )
+
+    # Секции по умолчанию и месячные секции от первого заказа до нескольких месяцев вперед
+    op.execute(
+        f'CREATE TABLE {SCHEMA}."Orders_default" PARTITION OF {SCHEMA}."Orders" DEFAULT'
+    )
+    op.execute(
+        f'CREATE TABLE {SCHEMA}."OrderItems_default" '
+        f'PARTITION OF {SCHEMA}."OrderItems" DEFAULT'
+    )
+    first_order_date = conn.execute(
+        sa.text(f'SELECT min(order_date) FROM {SCHEMA}."Orders_unpartitioned"')
+    ).scalar()
+    for month in _months(first_order_date):
+        next_month = _add_month(month)
+        suffix = month.strftime("_p%Y_%m")
+        for table_name in ("Orders", "OrderItems"):
+            op.execute(
+                f'CREATE TABLE {SCHEMA}."{table_name}{suffix}" '
+                f'PARTITION OF {SCHEMA}."{table_name}" '
+                f"FOR VALUES FROM ('{month}') TO ('{next_month}')"
+            )
+
+    # Данные переносятся до создания триггеров, чтобы не пересчитывать остатки и стоимость.
+    # Позиции получают дату своего заказа
+    op.execute(
+        f'INSERT INTO {SCHEMA}."Orders" ({ORDERS_COLUMNS}) '
+        f"SELECT order_id, user_id, COALESCE(order_date, CURRENT_TIMESTAMP), total_cost, "
+        f"status, claimed_by, claimed_at "
+        f'FROM {SCHEMA}."Orders_unpartitioned"'
+    )
+    op.execute(
+        f'INSERT INTO {SCHEMA}."OrderItems" ({ORDER_ITEMS_COLUMNS}) '
+        f"SELECT oi.order_item_id, oi.order_id, COALESCE(o.order_date, CURRENT_TIMESTAMP), "
+        f"oi.product_id, oi.quantity, oi.unit_price "
+        f'FROM {SCHEMA}."OrderItems_unpartitioned" oi '
+        f'LEFT JOIN {SCHEMA}."Orders" o ON o.order_id = oi.order_id'
+    )
+
+    _create_indexes(order_items_order_columns=["order_id", "order_date"])
+    _restore_table_state(saved)
+
+    op.drop_table("OrderItems_unpartitioned", schema=SCHEMA)
+    op.drop_table("Orders_unpartitioned", schema=SCHEMA)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    saved = _save_table_state(conn)
+    _rename_old_tables()
+
+    op.create_table(
+        "Orders",
+        sa.Column(
+            "order_id",
+            sa.Integer,
+            primary_key=True,
+            server_default=sa.text(f"nextval('{saved['orders_sequence']}'::regclass)"),
+        ),
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("delivery_tables_schema.Users.user_id", ondelete="CASCADE"),
+        ),
+        sa.Column(
+            "order_date", sa.TIMESTAMP, server_default=sa.text("CURRENT_TIMESTAMP")
+        ),
+        sa.Column("total_cost", sa.Integer, server_default=sa.text("0")),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("claimed_by", sa.String(50), nullable=True),
+        sa.Column("claimed_at", sa.TIMESTAMP, nullable=True),
+        schema=SCHEMA,
+    )
+    op.create_table(
+        "OrderItems",
+        sa.Column(
+            "order_item_id",
+            sa.Integer,
+            primary_key=True,
+            server_default=sa.text(
+                f"nextval('{saved['order_items_sequence']}'::regclass)"
+            ),
+        ),
+        sa.Column(
+            "order_id",
+            sa.Integer,
+            sa.ForeignKey("delivery_tables_schema.Orders.order_id", ondelete="CASCADE"),
+        ),
+        sa.Column(
+            "product_id",
+            sa.Integer,
+            sa.ForeignKey(
+                "delivery_tables_schema.Products.product_id", ondelete="CASCADE"
+            ),
+        ),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("unit_price", sa.Integer, nullable=True),
+        sa.CheckConstraint("quantity > 0", name="positive_quantity"),
+        schema=SCHEMA,
+    )
+
+    op.execute(
+        f'INSERT INTO {SCHEMA}."Orders" ({ORDERS_COLUMNS}) '
+        f'SELECT {ORDERS_COLUMNS} FROM {SCHEMA}."Orders_unpartitioned"'
+    )
+    op.execute(
+        f'INSERT INTO {SCHEMA}."OrderItems" '
+        f"(order_item_id, order_id, product_id, quantity, unit_price) "
+        f"SELECT order_item_id, order_id, product_id, quantity, unit_price "
+        f'FROM {SCHEMA}."OrderItems_unpartitioned"'
+    )
+
+    _create_indexes(order_items_order_columns=["order_id"])
+    _restore_table_state(saved)
+
+    # Секции удаляются вместе с секционированными таблицами
+    op.drop_table("OrderItems_unpartitioned", schema=SCHEMA)
+    op.drop_table("Orders_unpartitioned", schema=SCHEMA)
+
+
+def _save_table_state(conn):
+    """Последовательности ключей, триггеры и права текущих таблиц Orders и OrderItems"""
+    saved = {
+        "orders_sequence": conn.execute(
+            sa.text(f"SELECT pg_get_serial_sequence('{SCHEMA}.\"Orders\"', 'order_id')")
+        ).scalar(),
+        "order_items_sequence": conn.execute(
+            sa.text(
+                f"SELECT pg_get_serial_sequence('{SCHEMA}.\"OrderItems\"', 'order_item_id')"
+            )
+        ).scalar(),
+        "triggers": [],
+        "grants": [],
+    }
+    for table_name in ("Orders", "OrderItems"):
+        # Определения триггеров ссылаются на имя таблицы, которое перейдет к новой таблице
+        saved["triggers"].extend(
+            conn.execute(TRIGGERS, {"table_name": f'{SCHEMA}."{table_name}"'}).scalars()
+        )
+        saved["grants"].extend(
+            (table_name, row.grantee, row.privileges)
+            for row in conn.execute(
+                GRANTS, {"schema": SCHEMA, "table_name": table_name}
+            )
+        )
+    return saved
+
+
+def _rename_old_tables():
+    """Переименование текущих таблиц и их индексов, чтобы освободить имена для новых"""
+    for table_name in ("OrderItems", "Orders"):
+        op.rename_table(table_name, f"{table_name}_unpartitioned", schema=SCHEMA)
+        op.execute(
+            f'ALTER INDEX {SCHEMA}."{table_name}_pkey" '
+            f'RENAME TO "{table_name}_unpartitioned_pkey"'
+        )
+    for index_name in (
+        "fk_idx_orders_user_id",
+        "fk_idx_orderitems_order_id",
+        "fk_idx_orderitems_product_id",
+        "pending_idx_order_date",
+    ):
+        op.execute(f"DROP INDEX IF EXISTS {SCHEMA}.{index_name}")
+
+
+def _create_indexes(order_items_order_columns):
+    op.create_index("fk_idx_orders_user_id", "Orders", ["user_id"], schema=SCHEMA)
+    op.create_index(
+        "fk_idx_orderitems_order_id",
+        "OrderItems",
+        order_items_order_columns,
+        schema=SCHEMA,
+    )
+    op.create_index(
+        "fk_idx_orderitems_product_id", "OrderItems", ["product_id"], schema=SCHEMA
+    )
+    op.create_index(
+        "pending_idx_order_date",
+        "Orders",
+        ["order_date"],
+        schema=SCHEMA,
+        postgresql_where=sa.text("status = 'Pending'"),
+    )
+
+
+def _restore_table_state(saved):
+    """Перенос последовательностей, триггеров и прав на новые таблицы и их секции"""
+    conn = op.get_bind()
+    op.execute(
+        f"ALTER SEQUENCE {saved['orders_sequence']} "
+        f'OWNED BY {SCHEMA}."Orders".order_id'
+    )
+    op.execute(
+        f"ALTER SEQUENCE {saved['order_items_sequence']} "
+        f'OWNED BY {SCHEMA}."OrderItems".order_item_id'
+    )
+    for definition in saved["triggers"]:
+        op.execute(definition)
+    for table_name, grantee, privileges in saved["grants"]:
+        # Права на секционированную таблицу не переходят к секциям
+        partitions = conn.execute(
+            PARTITIONS, {"table_name": f'{SCHEMA}."{table_name}"'}
+        ).scalars()
+        for relation in (f'{SCHEMA}."{table_name}"', *partitions):
+            op.execute(f'GRANT {privileges} ON {relation} TO "{grantee}"')
+
+
+def _months(first_order_date):
+    """Первые числа месяцев от первого заказа до PARTITION_MONTHS_AHEAD месяцев вперед"""
+    today = datetime.date.today().replace(day=1)
+    month = first_order_date.date().replace(day=1) if first_order_date else today
+    last = today
+    for _ in range(PARTITION_MONTHS_AHEAD):
+        last = _add_month(last)
+    while month <= last:
+        yield month
+        month = _add_month(month)
+
+
+def _add_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
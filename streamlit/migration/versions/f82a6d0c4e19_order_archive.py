@@ -0,0 +1,72 @@
+"""order archive
+
+Revision ID: f82a6d0c4e19
+Revises: e5b19f3a8c64
+Create Date: 2026-10-18 17:21:05.874361
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f82a6d0c4e19"
+down_revision = "e5b19f3a8c64"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Выбор самых старых заказов для архивации
+    op.create_index(
+        "idx_order_date", "Orders", ["order_date"], schema="delivery_tables_schema"
+    )
+
+    # Архив заказов и позиций без внешних ключей на основные таблицы
+    op.create_schema("delivery_archive")
+    op.create_table(
+        "Orders",
+        sa.Column("order_id", sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("order_date", sa.TIMESTAMP, nullable=False),
+        sa.Column("total_cost", sa.Integer),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("claimed_by", sa.String(50), nullable=True),
+        sa.Column("claimed_at", sa.TIMESTAMP, nullable=True),
+        sa.Column(
+            "archived_at",
+            sa.TIMESTAMP,
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        schema="delivery_archive",
+    )
+    op.create_table(
+        "OrderItems",
+        sa.Column("order_item_id", sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column("order_id", sa.Integer, nullable=False),
+        sa.Column("order_date", sa.TIMESTAMP, nullable=False),
+        sa.Column("product_id", sa.Integer),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("unit_price", sa.Integer, nullable=True),
+        sa.Column(
+            "archived_at",
+            sa.TIMESTAMP,
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        schema="delivery_archive",
+    )
+    op.create_index(
+        "archive_idx_orderitems_order_id",
+        "OrderItems",
+        ["order_id"],
+        schema="delivery_archive",
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP SCHEMA delivery_archive CASCADE")
+    op.drop_index(
+        "idx_order_date", table_name="Orders", schema="delivery_tables_schema"
+    )